@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the redaction and logging path.
+
+Measures filter_datum, RedactingFormatter.format and the get_logger
+logger over a grid of message lengths, field counts, separators and PII
+fractions, and saves the results as JSON so runs can be compared.
+"""
+import argparse
+import io
+import json
+import logging
+import platform
+import random
+import string
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum, \
+    get_logger
+
+SEED = 0
+TARGETS = ("filter_datum", "formatter", "logger")
+METRICS = {
+    "lines_per_sec": "messages processed per second",
+    "peak_bytes_per_line": "average peak traced memory growth during "
+                           "one call, in bytes",
+    "retained_blocks_per_line": "memory blocks still alive after the run, "
+                                "results kept, per message",
+    "retained_bytes_per_line": "bytes still alive after the run, "
+                               "results kept, per message",
+}
+
+
+def make_fields(field_count: int) -> List[str]:
+    """
+    Build the list of fields to redact.
+
+    Args:
+        field_count (int): Number of fields; PII_FIELDS come first and
+        synthetic ``pii_<n>`` fields pad the list.
+
+    Returns:
+        List[str]: The fields to redact.
+    """
+    fields = list(PII_FIELDS[:field_count])
+    fields += [f"pii_{i}" for i in range(field_count - len(fields))]
+    return fields
+
+
+def make_messages(count: int, length: int, fields: List[str],
+                  separator: str, pii_fraction: float) -> List[str]:
+    """
+    Generate deterministic ``key=value<separator>`` messages.
+
+    Args:
+        count (int): Number of messages.
+        length (int): Approximate length of each message.
+        fields (List[str]): Fields that are redacted.
+        separator (str): The separator between key-value pairs.
+        pii_fraction (float): Fraction of the messages that contain
+        at least one of fields.
+
+    Returns:
+        List[str]: The messages.
+    """
+    rng = random.Random(SEED)
+    alphabet = string.ascii_letters + string.digits
+    messages = []
+    for _ in range(count):
+        keys = []
+        if rng.random() < pii_fraction:
+            keys = rng.sample(fields, min(len(fields), 3))
+        parts = []
+        size = 0
+        index = 0
+        while size < length:
+            key = keys[index] if index < len(keys) else f"attr_{index}"
+            value = ''.join(rng.choice(alphabet) for _ in range(12))
+            part = f"{key}={value}{separator}"
+            parts.append(part)
+            size += len(part)
+            index += 1
+        rng.shuffle(parts)
+        messages.append(''.join(parts))
+    return messages
+
+
+def make_target(target: str, fields: List[str],
+                separator: str) -> Callable[[str], object]:
+    """
+    Build the callable measured for one target.
+
+    Args:
+        target (str): One of TARGETS.
+        fields (List[str]): Fields that are redacted.
+        separator (str): The separator between key-value pairs.
+
+    Returns:
+        Callable[[str], object]: Function redacting one message.
+    """
+    if target == "filter_datum":
+        redaction = RedactingFormatter.REDACTION
+        return lambda message: filter_datum(fields, redaction, message,
+                                            separator)
+
+    if target == "formatter":
+        formatter_class = type("BenchFormatter", (RedactingFormatter,),
+                               {"SEPARATOR": separator})
+        formatter = formatter_class(fields)
+
+        def format_message(message: str) -> str:
+            record = logging.LogRecord("user_data", logging.INFO, __file__,
+                                       0, message, None, None)
+            return formatter.format(record)
+        return format_message
+
+    logger = get_logger()
+    for handler in logger.handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(io.StringIO())
+    return logger.info
+
+
+def measure(function: Callable[[str], object],
+            messages: List[str]) -> Dict[str, float]:
+    """
+    Time a target over the messages, then trace its memory use.
+
+    The memory figures come from tracemalloc: peak_bytes_per_line is the
+    average growth of traced memory at the peak of each call, i.e. the
+    scratch memory one message needs; retained_blocks_per_line and
+    retained_bytes_per_line are the blocks and bytes still alive once
+    every message was processed with its result kept.
+
+    Args:
+        function (Callable[[str], object]): Function redacting a message.
+        messages (List[str]): The messages.
+
+    Returns:
+        Dict[str, float]: lines_per_sec and the memory figures.
+    """
+    for message in messages[:100]:
+        function(message)
+
+    started = time.perf_counter()
+    for message in messages:
+        function(message)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    results = []
+    peak = 0
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for message in messages:
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        results.append(function(message))
+        peak += tracemalloc.get_traced_memory()[1] - current
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    del results
+
+    return {
+        "seconds": elapsed,
+        "lines_per_sec": len(messages) / elapsed,
+        "peak_bytes_per_line": peak / len(messages),
+        "retained_blocks_per_line": blocks / len(messages),
+        "retained_bytes_per_line": size / len(messages),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict:
+    """
+    Run every benchmark in the configured grid.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        Dict: The run metadata and one result per grid point.
+    """
+    results = []
+    for target in args.targets:
+        for length in args.lengths:
+            for field_count in args.field_counts:
+                for separator in args.separators:
+                    if target == "logger" and (
+                            separator != RedactingFormatter.SEPARATOR or
+                            field_count != len(PII_FIELDS)):
+                        continue
+                    fields = make_fields(field_count)
+                    function = make_target(target, fields, separator)
+                    for pii_fraction in args.pii_fractions:
+                        messages = make_messages(args.lines, length, fields,
+                                                 separator, pii_fraction)
+                        result = {
+                            "target": target,
+                            "length": length,
+                            "field_count": field_count,
+                            "separator": separator,
+                            "pii_fraction": pii_fraction,
+                            "lines": args.lines,
+                        }
+                        result.update(measure(function, messages))
+                        results.append(result)
+                        print(f"{target:12} len={length:<5} "
+                              f"fields={field_count:<4} "
+                              f"sep={separator!r:5} "
+                              f"pii={pii_fraction:<4} "
+                              f"{result['lines_per_sec']:>12.0f} lines/s "
+                              f"{result['peak_bytes_per_line']:8.0f} "
+                              f"peak B/line", file=sys.stderr)
+
+    return {
+        "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "metrics": METRICS,
+        "results": results,
+    }
+
+
+def parse_list(value: str, cast: Callable = str) -> List:
+    """
+    Split a comma-separated command-line value.
+
+    Args:
+        value (str): The raw value.
+        cast (Callable): Conversion applied to every item.
+
+    Returns:
+        List: The converted items.
+    """
+    return [cast(item) for item in value.split(",") if item]
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """
+    Parse the command-line arguments.
+
+    Args:
+        argv (List[str]): Arguments, defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the redaction and logging path.")
+    parser.add_argument("--targets", type=parse_list,
+                        default=list(TARGETS),
+                        help="comma-separated subset of "
+                             + ",".join(TARGETS))
+    parser.add_argument("--lengths", type=lambda v: parse_list(v, int),
+                        default=[64, 256, 1024],
+                        help="comma-separated message lengths")
+    parser.add_argument("--field-counts", type=lambda v: parse_list(v, int),
+                        default=[len(PII_FIELDS), 20, 100],
+                        help="comma-separated numbers of redacted fields")
+    parser.add_argument("--separators", type=lambda v: v.split(" "),
+                        default=[";", "|"],
+                        help="space-separated separators")
+    parser.add_argument("--pii-fractions",
+                        type=lambda v: parse_list(v, float),
+                        default=[0.0, 0.5, 1.0],
+                        help="comma-separated fractions of PII messages")
+    parser.add_argument("--lines", type=int, default=10000,
+                        help="messages per benchmark")
+    parser.add_argument("-o", "--output",
+                        help="write the JSON results to this file")
+    args = parser.parse_args(argv)
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    if args.lines < 1:
+        parser.error("--lines must be at least 1")
+    return args
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Run the benchmarks and save or print the JSON results.
+
+    Args:
+        argv (List[str]): Arguments, defaults to sys.argv[1:].
+    """
+    args = parse_args(argv)
+    report = run(args)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,20 +2,34 @@
 """
 Module for generating and validating salted, hashed passwords.
 """
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Iterable, List, Tuple
+
 import bcrypt
 
+HASH_WORKERS = os.cpu_count() or 1
+# Never calibrate below the bcrypt library default unless asked to
+MIN_ROUNDS = 12
+MAX_ROUNDS = 31
+
 
-def hash_password(password: str) -> bytes:
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Generates a salted, hashed password from a plaintext password.
 
     Args:
         password (str): The plaintext password to be hashed.
+        rounds (int): The bcrypt work factor, e.g. from
+        calibrate_rounds(). Defaults to the bcrypt library default.
 
     Returns:
         bytes: The salted, hashed password as a byte string.
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    salt = bcrypt.gensalt() if rounds is None else bcrypt.gensalt(rounds)
+    return bcrypt.hashpw(password.encode('utf-8'), salt)
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
@@ -30,3 +44,110 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         bool: True if the password matches the hash, False otherwise.
     """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """
+    Reads the work factor a bcrypt hash was created with.
+
+    Args:
+        hashed_password (bytes): The hashed password, e.g. b"$2b$12$...".
+
+    Returns:
+        int: The bcrypt work factor.
+    """
+    return int(hashed_password.split(b'$')[2])
+
+
+def calibrate_rounds(target_seconds: float = 0.25,
+                     min_rounds: int = MIN_ROUNDS,
+                     max_rounds: int = MAX_ROUNDS) -> int:
+    """
+    Picks the highest bcrypt work factor whose hash time on this machine
+    stays within a latency target.
+
+    Each extra round doubles the hash time, so the rounds are increased
+    one at a time until a hash takes longer than target_seconds.
+
+    Args:
+        target_seconds (float): The maximum time a single hash may take.
+        min_rounds (int): The lowest work factor ever returned. Defaults
+        to the bcrypt library default of 12; pass a lower value only
+        to trade hash strength for latency on purpose.
+        max_rounds (int): The highest work factor ever returned.
+
+    Returns:
+        int: The calibrated work factor.
+    """
+    password = b"calibration password"
+    rounds = min_rounds
+    while rounds < max_rounds:
+        salt = bcrypt.gensalt(rounds + 1)
+        started = time.perf_counter()
+        bcrypt.hashpw(password, salt)
+        if time.perf_counter() - started > target_seconds:
+            break
+        rounds += 1
+    return rounds
+
+
+def verify_and_check_rounds(hashed_password: bytes, password: str,
+                            rounds: int) -> Tuple[bool, bool]:
+    """
+    Validates a password and reports whether its hash is weaker than the
+    current work factor and should be redone with it.
+
+    Args:
+        hashed_password (bytes): The stored hashed password.
+        password (str): The plaintext password to validate.
+        rounds (int): The current work factor, e.g. from
+        calibrate_rounds().
+
+    Returns:
+        Tuple[bool, bool]: Whether the password is valid, and whether it
+        is valid but hashed with a work factor lower than rounds, so the
+        caller should store hash_password(password, rounds) instead. A
+        hash with a higher work factor is never downgraded.
+    """
+    valid = is_valid(hashed_password, password)
+    return valid, valid and hash_rounds(hashed_password) < rounds
+
+
+def hash_passwords_many(passwords: Iterable[str],
+                        workers: int = HASH_WORKERS,
+                        rounds: int = None) -> List[bytes]:
+    """
+    Hashes many plaintext passwords concurrently.
+
+    bcrypt releases the GIL while hashing, so a thread pool keeps
+    several cores busy.
+
+    Args:
+        passwords (Iterable[str]): The plaintext passwords to be hashed.
+        workers (int): The number of hashing threads.
+        rounds (int): The bcrypt work factor, as for hash_password.
+
+    Returns:
+        List[bytes]: The salted, hashed passwords, in input order.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(partial(hash_password, rounds=rounds),
+                                 passwords))
+
+
+def verify_many(hashed_passwords: Iterable[bytes], passwords: Iterable[str],
+                workers: int = HASH_WORKERS) -> List[bool]:
+    """
+    Validates many plaintext passwords against their hashes concurrently.
+
+    Args:
+        hashed_passwords (Iterable[bytes]): The hashed passwords.
+        passwords (Iterable[str]): The plaintext passwords to validate,
+        paired with hashed_passwords by position.
+        workers (int): The number of verifying threads.
+
+    Returns:
+        List[bool]: Whether each password matches its hash, in input order.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(is_valid, hashed_passwords, passwords))
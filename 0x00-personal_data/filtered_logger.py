@@ -3,10 +3,27 @@
 Module for replacing occurrences of certain field values using regex.
 """
 import re
-from typing import List
+import argparse
+import atexit
+import copy
+import gzip
+import queue
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener, \
+    RotatingFileHandler
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, \
+    Optional, Sequence, Tuple
+import json
 import logging
 import mysql.connector
 import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 
 
 class RedactingFormatter(logging.Formatter):
@@ -18,36 +35,308 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], json_lines: bool = False):
         """
         Initialize the RedactingFormatter.
 
         Args:
             fields (List[str]): List of fields to redact in log messages.
+            json_lines (bool): Render every record as one JSON object
+            per line instead of FORMAT.
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.field_set = frozenset(fields)
+        self.json_lines = json_lines
+        self.engine = get_redaction_engine(tuple(fields), self.REDACTION,
+                                           self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
         """
         Format the log record by redacting specified fields.
 
+        Records logged with ``extra={'redacted': True}`` were already
+        redacted by column (see redact_row) and are not scanned again.
+        Structured records (see structured_data) are redacted by key.
+
         Args:
             record (logging.LogRecord): The log record to format.
 
         Returns:
             str: The formatted log record with redacted fields.
         """
-        return filter_datum(self.fields, self.REDACTION,
-                            super().format(record), self.SEPARATOR)
+        data = structured_data(record)
+        if data is not None or self.json_lines:
+            return self.format_structured(record, data)
+        if getattr(record, 'redacted', False):
+            # The message skips the regex, the traceback does not
+            record = copy.copy(record)
+            record.exc_text = None
+            return super().format(record)
+        return self.engine.redact(super().format(record))
+
+    def formatException(self, ei) -> str:
+        """
+        Format an exception with the fields redacted from its traceback.
+
+        Args:
+            ei: The exception info tuple.
+
+        Returns:
+            str: The redacted traceback.
+        """
+        return self.engine.redact(super().formatException(ei))
+
+    def formatStack(self, stack_info: str) -> str:
+        """
+        Format stack information with the fields redacted from it.
+
+        Args:
+            stack_info (str): The stack information.
+
+        Returns:
+            str: The redacted stack information.
+        """
+        return self.engine.redact(super().formatStack(stack_info))
+
+    def format_structured(self, record: logging.LogRecord,
+                          data: Optional[Dict]) -> str:
+        """
+        Format a record whose fields are passed as a dict, redacting the
+        values of keys in fields with a set lookup instead of a regex.
+
+        Args:
+            record (logging.LogRecord): The log record to format.
+            data (Optional[Dict]): The record's structured fields.
+
+        Returns:
+            str: The formatted log record with redacted fields.
+        """
+        message = ''
+        if not isinstance(record.msg, dict):
+            message = record.getMessage()
+            if not getattr(record, 'redacted', False):
+                message = self.engine.redact(message)
+        redacted = {}
+        if data is not None:
+            redacted = redact_mapping(data, self.field_set, self.REDACTION)
+
+        if self.json_lines:
+            entry = {
+                "name": record.name,
+                "levelname": record.levelname,
+                "asctime": self.formatTime(record),
+                "message": message,
+            }
+            if data is not None:
+                entry["data"] = redacted
+            if record.exc_info:
+                entry["exc_text"] = self.formatException(record.exc_info)
+            if record.stack_info:
+                entry["stack_info"] = self.formatStack(record.stack_info)
+            return json.dumps(entry, default=str)
+
+        rendered = ''.join(f'{key}={value}{self.SEPARATOR}'
+                           for key, value in redacted.items())
+        record = copy.copy(record)
+        record.msg = f'{message} {rendered}' if message else rendered
+        record.args = None
+        # A traceback cached by another formatter was not redacted
+        record.exc_text = None
+        return super().format(record)
+
+
+def structured_data(record: logging.LogRecord) -> Optional[Dict]:
+    """
+    Return the dict a record was logged with, if any.
+
+    The dict is either the message itself, as in ``logger.info({...})``,
+    or passed as ``extra={'data': {...}}``.
+
+    Args:
+        record (logging.LogRecord): The log record.
+
+    Returns:
+        Optional[Dict]: The structured fields, or None.
+    """
+    if isinstance(record.msg, dict):
+        return record.msg
+    data = getattr(record, 'data', None)
+    return data if isinstance(data, dict) else None
+
+
+def redact_mapping(data: Dict, fields: FrozenSet[str],
+                   redaction: str) -> Dict:
+    """
+    Redact the values of the keys found in fields, in data and in the
+    dicts nested in its values (see redact_value).
+
+    Args:
+        data (Dict): The structured log fields.
+        fields (FrozenSet[str]): Keys whose values are redacted.
+        redaction (str): The string to replace the values with.
+
+    Returns:
+        Dict: A redacted copy of data, in the same key order.
+    """
+    return {key: redaction if key in fields
+            else redact_value(value, fields, redaction)
+            for key, value in data.items()}
+
+
+def redact_value(value: Any, fields: FrozenSet[str], redaction: str) -> Any:
+    """
+    Redact the dicts nested in a structured value, through any depth of
+    dicts, lists and tuples; other values are returned as is.
+
+    Args:
+        value (Any): The value of a key not in fields.
+        fields (FrozenSet[str]): Keys whose values are redacted.
+        redaction (str): The string to replace the values with.
+
+    Returns:
+        Any: The value, or a redacted copy of it.
+    """
+    if isinstance(value, dict):
+        return redact_mapping(value, fields, redaction)
+    if isinstance(value, list):
+        return [redact_value(item, fields, redaction) for item in value]
+    if isinstance(value, tuple):
+        return tuple(redact_value(item, fields, redaction) for item in value)
+    return value
+
+
+class RedactionEngine:
+    """
+    Precompiled single-pass redactor for a fixed set of fields.
+
+    All fields are folded into one alternation pattern, so a message
+    is scanned once no matter how many fields are redacted. Above
+    TRIE_THRESHOLD fields, the alternation is compiled from a prefix trie
+    of the field names instead, so matching a key costs the same whatever
+    the number of fields. Either way, field names are matched literally,
+    never as regex.
+    """
+
+    TRIE_THRESHOLD = 16
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """
+        Compile the alternation pattern for the given fields.
+
+        Args:
+            fields (Tuple[str, ...]): Fields whose values are redacted.
+            redaction (str): The string to replace the field values with.
+            separator (str): The character that separates
+            key-value pairs in the message.
+        """
+        self.fields = fields
+        self.redaction = redaction
+        self.separator = separator
+        if len(fields) > self.TRIE_THRESHOLD:
+            alternation = trie_alternation(fields)
+        else:
+            alternation = '|'.join(re.escape(field) for field in fields)
+        self.pattern = re.compile(
+            f'(?P<field>{alternation})=(.*?){re.escape(separator)}')
+        self.replacement = '\\g<field>={}{}'.format(
+            redaction.replace('\\', '\\\\'),
+            separator.replace('\\', '\\\\'))
+
+    def redact(self, message: str) -> str:
+        """
+        Redact every configured field in a single scan of the message.
+
+        Args:
+            message (str): The original log message.
+
+        Returns:
+            str: The obfuscated log message.
+        """
+        if not self.fields:
+            return message
+        return self.pattern.sub(self.replacement, message)
+
+
+def trie_alternation(fields: Iterable[str]) -> str:
+    """
+    Build a regex matching any of the fields, structured as a prefix trie
+    so the regex engine follows one branch per character of the key.
+
+    Args:
+        fields (Iterable[str]): Literal field names.
+
+    Returns:
+        str: The regex source, e.g. ``(?:e(?:mail|ye)|name)``.
+    """
+    trie = {}
+    for field in fields:
+        node = trie
+        for char in field:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return _trie_node_regex(trie)
+
+
+def _trie_node_regex(node: Dict[str, Dict]) -> str:
+    """
+    Build the regex for the suffixes below one trie node.
+
+    Args:
+        node (Dict[str, Dict]): Children by character; the '' key marks
+        the end of a field.
+
+    Returns:
+        str: The regex source for the node.
+    """
+    branches = [re.escape(char) + _trie_node_regex(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    if len(branches) == 1:
+        regex = branches[0]
+        return f'(?:{regex})?' if '' in node else regex
+    regex = '(?:{})'.format('|'.join(branches))
+    return regex + '?' if '' in node else regex
+
+
+@lru_cache(maxsize=128)
+def get_redaction_engine(fields: Tuple[str, ...], redaction: str,
+                         separator: str) -> RedactionEngine:
+    """
+    Return the cached RedactionEngine for a (fields, separator) set.
+
+    Args:
+        fields (Tuple[str, ...]): Fields whose values are redacted.
+        redaction (str): The string to replace the field values with.
+        separator (str): The character that separates
+        key-value pairs in the message.
+
+    Returns:
+        RedactionEngine: The compiled engine, shared between callers.
+    """
+    return RedactionEngine(fields, redaction, separator)
 
 
 PII_FIELDS = ("name", "email", "password", "ssn", "phone")
+EXPORT_BATCH_SIZE = 1000
+EXPORT_STATE_FILE = ".export_state.json"
+WATERMARK_COLUMN = "last_login"
+LOG_QUEUE_SIZE = 10000
+LOG_OVERFLOW_POLICIES = ("block", "drop_new", "drop_oldest")
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+LOG_FLUSH_RECORDS = 1000
+LOG_FLUSH_BYTES = 64 * 1024
+LOG_FLUSH_INTERVAL_MS = 1000
+DB_POOL_SIZE = 5
+DB_POOL_TIMEOUT = 30.0
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
+def connect_db() -> mysql.connector.connection.MySQLConnection:
     """
-    Establish and return a connection to the MySQL database.
+    Open a new, unpooled connection to the MySQL database.
 
     Returns:
         mysql.connector.connection.MySQLConnection: Database
@@ -62,10 +351,522 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     return db_connection
 
 
+def get_db() -> mysql.connector.connection.MySQLConnection:
+    """
+    Return a connection to the MySQL database.
+
+    Connections come from a process-wide ConnectionPool configured by the
+    PERSONAL_DATA_DB_POOL_* variables, and close() hands them back to the
+    pool. PERSONAL_DATA_DB_POOL_SIZE=0 disables pooling.
+
+    Returns:
+        mysql.connector.connection.MySQLConnection: Database
+        connection instance.
+    """
+    global _db_pool
+
+    pool_size = _getenv_number('PERSONAL_DATA_DB_POOL_SIZE', DB_POOL_SIZE)
+    if pool_size <= 0:
+        return connect_db()
+
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = ConnectionPool(
+                connect_db, pool_size,
+                _getenv_number('PERSONAL_DATA_DB_POOL_TIMEOUT',
+                               DB_POOL_TIMEOUT),
+                os.getenv('PERSONAL_DATA_DB_POOL_HEALTH_CHECK', '1') != '0')
+    return _db_pool.get_connection()
+
+
+def _getenv_number(name: str, default: float) -> float:
+    """
+    Read a numeric environment variable.
+
+    Args:
+        name (str): Name of the environment variable.
+        default (float): Value used when it is unset or invalid.
+
+    Returns:
+        float: The parsed value, or default.
+    """
+    try:
+        return type(default)(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of database connections reused across get_db calls.
+
+    Connections are rolled back when they are returned, so the next
+    checkout starts a fresh transaction instead of reading through the
+    snapshot of the previous one; a connection that cannot be rolled back
+    is closed instead. Idle connections are checked with a ``SELECT 1``
+    on checkout and replaced when the check fails.
+    """
+
+    def __init__(self, connect: Callable, size: int = DB_POOL_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT,
+                 health_check: bool = True):
+        """
+        Initialize the ConnectionPool.
+
+        Args:
+            connect (Callable): Factory opening a new connection.
+            size (int): Maximum number of open connections.
+            timeout (float): Seconds to wait for a free connection.
+            health_check (bool): Ping idle connections on checkout.
+        """
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_check = health_check
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def get_connection(self) -> "PooledConnection":
+        """
+        Check a connection out of the pool, opening one if none is idle.
+
+        Returns:
+            PooledConnection: The connection; close() returns it.
+
+        Raises:
+            TimeoutError: If every connection stays checked out for
+            longer than the pool timeout.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("Connection pool exhausted")
+        try:
+            connection = self._checkout_idle()
+            if connection is None:
+                connection = self.connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        return PooledConnection(self, connection)
+
+    def _checkout_idle(self):
+        """
+        Pop the most recently used healthy idle connection, if any.
+
+        Returns:
+            The idle connection, or None if there is none left.
+        """
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if not self.health_check or self._is_healthy(connection):
+                return connection
+            self._discard(connection)
+
+    @staticmethod
+    def _is_healthy(connection) -> bool:
+        """
+        Check that a connection still answers a trivial query.
+
+        Args:
+            connection: The connection to check.
+
+        Returns:
+            bool: True if ``SELECT 1`` succeeded.
+        """
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _discard(connection) -> None:
+        """
+        Close a connection that is leaving the pool, ignoring errors.
+
+        Args:
+            connection: The connection to close.
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def release(self, connection) -> None:
+        """
+        Roll back a checked-out connection and return it to the pool.
+
+        Args:
+            connection: The raw connection wrapped by a PooledConnection.
+        """
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+        else:
+            self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """
+        Close every idle connection held by the pool.
+        """
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+class PooledConnection:
+    """
+    Proxy for a pooled connection: close() returns the connection to its
+    pool and every other attribute is delegated to the connection.
+    """
+
+    def __init__(self, pool: ConnectionPool, connection):
+        """
+        Initialize the PooledConnection.
+
+        Args:
+            pool (ConnectionPool): The pool the connection belongs to.
+            connection: The raw database connection.
+        """
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name: str):
+        """
+        Delegate attribute access to the wrapped connection.
+
+        Args:
+            name (str): Attribute name.
+
+        Returns:
+            The attribute of the wrapped connection.
+        """
+        if self._connection is None:
+            raise AttributeError(f"{name}: connection returned to pool")
+        return getattr(self._connection, name)
+
+    def close(self) -> None:
+        """
+        Return the connection to the pool. Closing twice is a no-op.
+        """
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        self._pool.release(connection)
+
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+class SQLiteConnection:
+    """
+    Thin DB-API adapter exposing a SQLite database through the subset of
+    the mysql.connector connection API used by the export pipeline, so
+    the pipeline can run against a local stand-in for the users table.
+    """
+
+    def __init__(self, database: str = ":memory:"):
+        """
+        Open the SQLite database.
+
+        Args:
+            database (str): Path to the database file.
+        """
+        self.connection = sqlite3.connect(database,
+                                          check_same_thread=False)
+
+    paramstyle = "qmark"
+
+    def cursor(self, buffered: bool = False) -> sqlite3.Cursor:
+        """
+        Return a new cursor. SQLite cursors always step through the
+        result set lazily, so ``buffered`` is accepted and ignored.
+
+        Args:
+            buffered (bool): Ignored; kept for API compatibility.
+
+        Returns:
+            sqlite3.Cursor: The new cursor.
+        """
+        return self.connection.cursor()
+
+    def commit(self) -> None:
+        """
+        Commit the current transaction.
+        """
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        """
+        Roll back the current transaction.
+        """
+        self.connection.rollback()
+
+    def close(self) -> None:
+        """
+        Close the underlying SQLite connection.
+        """
+        self.connection.close()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler that hands raw records to a bounded queue and applies an
+    overflow policy when the queue is full. Formatting, and therefore
+    redaction, is left to the handler behind the QueueListener.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "block"):
+        """
+        Initialize the BoundedQueueHandler.
+
+        Args:
+            log_queue (queue.Queue): The bounded queue records go to.
+            overflow (str): One of LOG_OVERFLOW_POLICIES: "block" waits
+            for room, "drop_new" discards the incoming record and
+            "drop_oldest" discards the oldest queued record.
+        """
+        if overflow not in LOG_OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        super(BoundedQueueHandler, self).__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merge the message arguments without formatting the record, so
+        the redaction cost is paid on the listener thread.
+
+        Args:
+            record (logging.LogRecord): The record being logged.
+
+        Returns:
+            logging.LogRecord: A copy of the record safe to enqueue.
+        """
+        record = copy.copy(record)
+        if isinstance(record.msg, dict):
+            record.msg = dict(record.msg)
+        else:
+            record.msg = record.getMessage()
+            record.args = None
+        if isinstance(getattr(record, 'data', None), dict):
+            record.data = dict(record.data)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Put the record on the queue according to the overflow policy.
+
+        Args:
+            record (logging.LogRecord): The prepared record.
+        """
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == "drop_new":
+                    return
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            # Keep the unfinished count right for flush_logger's join()
+            self.queue.task_done()
+
+
+class BackgroundQueueListener(QueueListener):
+    """
+    QueueListener whose shutdown waits for room in a full queue instead
+    of failing, so every queued record is written before stop() returns.
+    """
+
+    def enqueue_sentinel(self) -> None:
+        """
+        Block until the stop sentinel fits behind the queued records.
+        """
+        self.queue.put(self._sentinel)
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    Size-rotated file handler that buffers formatted records and writes
+    them in one call once flush_records records or flush_bytes bytes are
+    pending, or flush_interval_ms has passed. Rotated segments can be
+    gzipped on a background thread.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = LOG_FILE_MAX_BYTES,
+                 backup_count: int = LOG_FILE_BACKUP_COUNT,
+                 flush_records: int = LOG_FLUSH_RECORDS,
+                 flush_bytes: int = LOG_FLUSH_BYTES,
+                 flush_interval_ms: int = LOG_FLUSH_INTERVAL_MS,
+                 compress: bool = False):
+        """
+        Initialize the BufferedRotatingFileHandler.
+
+        Args:
+            filename (str): Path of the active log file.
+            max_bytes (int): Size at which the file is rotated.
+            backup_count (int): Number of rotated segments kept.
+            flush_records (int): Pending records that trigger a write.
+            flush_bytes (int): Pending bytes that trigger a write.
+            flush_interval_ms (int): Maximum age of pending records.
+            compress (bool): Gzip rotated segments (``<file>.1.gz``).
+        """
+        super(BufferedRotatingFileHandler, self).__init__(
+            filename, maxBytes=max_bytes, backupCount=backup_count,
+            encoding='utf-8')
+        self.flush_records = flush_records
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval_ms / 1000
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._last_flush = time.monotonic()
+        self._compressor = None
+        self._compression = None
+        if compress:
+            self._compressor = ThreadPoolExecutor(max_workers=1)
+            self.namer = lambda name: name + ".gz"
+            self.rotator = self._rotate_compressed
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically,
+                                         daemon=True)
+        self._flusher.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Format the record into the buffer, writing the buffer out when
+        one of the flush thresholds is reached.
+
+        Args:
+            record (logging.LogRecord): The record being logged.
+        """
+        try:
+            line = self.format(record) + self.terminator
+            self._buffer.append(line)
+            self._buffered_bytes += len(line)
+            if len(self._buffer) >= self.flush_records or \
+                    self._buffered_bytes >= self.flush_bytes or \
+                    time.monotonic() - self._last_flush >= \
+                    self.flush_interval:
+                self._write_buffer()
+        except Exception:
+            self.handleError(record)
+
+    def _write_buffer(self) -> None:
+        """
+        Write the pending records, rotating first if they would push the
+        file past max_bytes. Called with the handler lock held.
+        """
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered_bytes = 0
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes > 0 and self.stream.tell() > 0 and \
+                self.stream.tell() + len(data) > self.maxBytes:
+            self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+        self.stream.write(data)
+        self.stream.flush()
+
+    def flush(self) -> None:
+        """
+        Write out every pending record.
+        """
+        self.acquire()
+        try:
+            self._write_buffer()
+        finally:
+            self.release()
+
+    def _flush_periodically(self) -> None:
+        """
+        Flush records left pending when the logger goes idle.
+        """
+        while not self._stopped.wait(self.flush_interval):
+            if self._buffer and time.monotonic() - self._last_flush >= \
+                    self.flush_interval:
+                self.flush()
+
+    def doRollover(self) -> None:
+        """
+        Rotate the file once the previous segment is compressed, so the
+        segment numbering never races with the compressor.
+        """
+        if self._compression is not None:
+            self._compression.result()
+            self._compression = None
+        super(BufferedRotatingFileHandler, self).doRollover()
+
+    def _rotate_compressed(self, source: str, dest: str) -> None:
+        """
+        Move the active file aside and gzip it to dest in the background.
+
+        Args:
+            source (str): Path of the active log file.
+            dest (str): Path of the gzipped segment.
+        """
+        pending = dest + ".pending"
+        os.replace(source, pending)
+        self._compression = self._compressor.submit(gzip_segment, pending,
+                                                    dest)
+
+    def close(self) -> None:
+        """
+        Write out pending records, finish compressing, and close the file.
+        """
+        self._stopped.set()
+        self.flush()
+        if self._compressor is not None:
+            self._compressor.shutdown(wait=True)
+        super(BufferedRotatingFileHandler, self).close()
+
+
+def gzip_segment(source: str, dest: str) -> None:
+    """
+    Gzip a rotated log segment and remove the uncompressed copy.
+
+    Args:
+        source (str): Path of the uncompressed segment.
+        dest (str): Path of the gzipped segment.
+    """
+    with open(source, 'rb') as f_in, gzip.open(dest + ".part", 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.replace(dest + ".part", dest)
+    os.remove(source)
+
+
+_log_listener = None
+
+
 def filter_datum(fields: List[str], redaction: str, message: str,
                  separator: str) -> str:
     """
-    Obfuscate specified fields in a log message using regex.
+    Obfuscate specified fields in a log message using a single
+    precompiled regex scan.
 
     Args:
         fields (List[str]): List of fields to redact.
@@ -78,57 +879,558 @@ def filter_datum(fields: List[str], redaction: str, message: str,
     Returns:
         str: The obfuscated log message.
     """
-    for field in fields:
-        message = re.sub(f'{field}=(.*?){separator}',
-                         f'{field}={redaction}{separator}', message)
-    return message
+    engine = get_redaction_engine(tuple(fields), redaction, separator)
+    return engine.redact(message)
+
+
+def get_pii_indexes(field_names: List[str],
+                    fields: Sequence[str] = PII_FIELDS) -> FrozenSet[int]:
+    """
+    Find the positions of the PII columns in a result set.
+
+    Args:
+        field_names (List[str]): Column names, in cursor.description order.
+        fields (Sequence[str]): Names of the columns to redact.
+
+    Returns:
+        FrozenSet[int]: Indexes of the columns whose values are redacted.
+    """
+    return frozenset(index for index, name in enumerate(field_names)
+                     if name in fields)
+
+
+def redact_row(row: Sequence, field_names: List[str],
+               pii_indexes: FrozenSet[int],
+               redaction: str = RedactingFormatter.REDACTION) -> str:
+    """
+    Build the ``field=value; `` log message for a row, redacting the
+    PII columns by position instead of scanning the message with a regex.
 
+    Args:
+        row (Sequence): One row of the result set.
+        field_names (List[str]): Column names, in row order.
+        pii_indexes (FrozenSet[int]): Indexes returned by get_pii_indexes.
+        redaction (str): The string to replace the PII values with.
+
+    Returns:
+        str: The redacted log message, in the same format main() logs.
+    """
+    return '; '.join(
+        f'{name}={redaction}' if index in pii_indexes else f'{name}={value}'
+        for index, (name, value) in enumerate(zip(field_names, row))) + ';'
+
+
+def get_export_batch_size() -> int:
+    """
+    Read the fetchmany batch size used by the export pipeline.
+
+    Returns:
+        int: PERSONAL_DATA_EXPORT_BATCH_SIZE, or EXPORT_BATCH_SIZE
+        when it is unset or invalid.
+    """
+    try:
+        batch_size = int(os.getenv('PERSONAL_DATA_EXPORT_BATCH_SIZE',
+                                   EXPORT_BATCH_SIZE))
+    except ValueError:
+        return EXPORT_BATCH_SIZE
+    return batch_size if batch_size > 0 else EXPORT_BATCH_SIZE
+
+
+def fetch_rows(cursor, batch_size: int) -> Iterator[Sequence]:
+    """
+    Stream rows from an executed cursor, holding at most one
+    fetchmany batch in memory at a time.
 
-def get_logger() -> logging.Logger:
+    Args:
+        cursor: An executed DB-API cursor.
+        batch_size (int): Number of rows requested per fetchmany call.
+
+    Yields:
+        Sequence: One row of the result set.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def format_rows(rows: Iterable[Sequence], field_names: List[str],
+                pii_indexes: FrozenSet[int]) -> Iterator[str]:
+    """
+    Lazily turn rows into ``field=value; `` log messages.
+
+    Args:
+        rows (Iterable[Sequence]): Rows, as yielded by fetch_rows.
+        field_names (List[str]): Column names, in row order.
+        pii_indexes (FrozenSet[int]): Indexes of the columns to redact.
+
+    Yields:
+        str: One log message per row.
+    """
+    for row in rows:
+        yield redact_row(row, field_names, pii_indexes)
+
+
+def write_messages(messages: Iterable[str], logger: logging.Logger,
+                   redacted: bool = True) -> int:
+    """
+    Log every message, consuming the pipeline one message at a time.
+
+    Args:
+        messages (Iterable[str]): Messages, as yielded by format_rows.
+        logger (logging.Logger): Logger the messages are written to.
+        redacted (bool): Whether the messages were already redacted by
+        column, so RedactingFormatter does not scan them again.
+
+    Returns:
+        int: The number of messages written.
+    """
+    count = 0
+    for message in messages:
+        logger.info(message, extra={'redacted': redacted})
+        count += 1
+    return count
+
+
+def track_watermark(rows: Iterable[Sequence], index: int,
+                    watermark: Dict) -> Iterator[Sequence]:
+    """
+    Pass rows through while recording the highest value of one column.
+
+    Args:
+        rows (Iterable[Sequence]): Rows, as yielded by fetch_rows.
+        index (int): Index of the watermark column.
+        watermark (Dict): Updated in place; its WATERMARK_COLUMN key holds
+        the highest non-NULL value seen so far.
+
+    Yields:
+        Sequence: The rows, unchanged.
+    """
+    for row in rows:
+        value = row[index]
+        if value is not None:
+            current = watermark.get(WATERMARK_COLUMN)
+            if current is None or value > current:
+                watermark[WATERMARK_COLUMN] = value
+        yield row
+
+
+def export_users(db, logger: logging.Logger, batch_size: int = None,
+                 redact_by_column: bool = True, since=None,
+                 watermark: Dict = None, order_by: Sequence[str] = None,
+                 offset: int = None, limit: int = None) -> int:
+    """
+    Stream the users table through fetch -> redact -> format -> write.
+
+    An unbuffered cursor and fetchmany keep peak memory bounded by
+    batch_size rather than by the number of rows in the table.
+
+    Args:
+        db: A mysql.connector connection or a SQLiteConnection.
+        logger (logging.Logger): Logger the rows are written to.
+        batch_size (int): Rows per fetchmany call; defaults to
+        get_export_batch_size().
+        redact_by_column (bool): Redact the PII columns by position
+        before the message is built (no regex). When False, the full
+        message is built and RedactingFormatter scans it instead.
+        since: Only export rows whose last_login is newer than this.
+        watermark (Dict): If given, its WATERMARK_COLUMN key is set to
+        the newest last_login exported (see track_watermark).
+        order_by (Sequence[str]): Columns the rows are sorted by.
+        offset (int): Number of sorted rows to skip.
+        limit (int): Maximum number of rows to export.
+
+    Returns:
+        int: The number of rows exported.
+    """
+    if batch_size is None:
+        batch_size = get_export_batch_size()
+
+    query = "SELECT * FROM users"
+    params = ()
+    if since is not None:
+        placeholder = "?" if getattr(db, 'paramstyle', None) == "qmark" \
+            else "%s"
+        query += f" WHERE {WATERMARK_COLUMN} > {placeholder}"
+        params = (since,)
+    if order_by:
+        query += " ORDER BY {}".format(", ".join(order_by))
+    elif watermark is not None:
+        query += f" ORDER BY {WATERMARK_COLUMN}"
+    if limit is not None:
+        query += f" LIMIT {int(limit)} OFFSET {int(offset or 0)}"
+
+    cursor = db.cursor(buffered=False)
+    try:
+        cursor.execute(query + ";", params)
+        field_names = [field[0] for field in cursor.description]
+        pii_indexes = frozenset()
+        if redact_by_column:
+            pii_indexes = get_pii_indexes(field_names)
+
+        rows = fetch_rows(cursor, batch_size)
+        if watermark is not None:
+            rows = track_watermark(rows, field_names.index(WATERMARK_COLUMN),
+                                   watermark)
+        messages = format_rows(rows, field_names, pii_indexes)
+        return write_messages(messages, logger, redact_by_column)
+    finally:
+        cursor.close()
+
+
+def get_export_state_file() -> str:
+    """
+    Return the path of the incremental export state file.
+
+    Returns:
+        str: PERSONAL_DATA_EXPORT_STATE, or EXPORT_STATE_FILE.
+    """
+    return os.getenv('PERSONAL_DATA_EXPORT_STATE', EXPORT_STATE_FILE)
+
+
+def read_watermark(state_path: str) -> Optional[str]:
+    """
+    Read the last exported last_login from the state file.
+
+    Args:
+        state_path (str): Path to the state file.
+
+    Returns:
+        Optional[str]: The watermark, or None before the first run.
+    """
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, 'r') as f:
+        return json.load(f).get(WATERMARK_COLUMN)
+
+
+def write_watermark(state_path: str, value) -> None:
+    """
+    Atomically replace the state file with a new watermark.
+
+    The state is written to a temporary file in the same directory,
+    synced, then renamed over the old file, so a crash leaves either
+    the old or the new watermark.
+
+    Args:
+        state_path (str): Path to the state file.
+        value: The newest last_login exported.
+    """
+    directory = os.path.dirname(os.path.abspath(state_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".export_state")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({WATERMARK_COLUMN: str(value)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, state_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def export_users_incremental(db, logger: logging.Logger,
+                             state_path: str = None, batch_size: int = None,
+                             redact_by_column: bool = True) -> int:
+    """
+    Export only the users whose last_login is newer than the watermark
+    kept in the state file, then advance the watermark.
+
+    The watermark is only written once every row was written and
+    flush_logger returned, so with a queued logger it waits for the
+    listener to write every queued row. A queued logger that may drop
+    records is refused: the dropped rows would be skipped for good.
+
+    Args:
+        db: A mysql.connector connection or a SQLiteConnection.
+        logger (logging.Logger): Logger the rows are written to.
+        state_path (str): Path to the state file; defaults to
+        get_export_state_file().
+        batch_size (int): Rows per fetchmany call.
+        redact_by_column (bool): See export_users.
+
+    Returns:
+        int: The number of rows exported.
+
+    Raises:
+        ValueError: If the logger drops records when its queue is full.
+    """
+    for handler in logger.handlers:
+        if getattr(handler, 'overflow', "block") != "block":
+            raise ValueError("Incremental export needs a logger that "
+                             "never drops records")
+    if state_path is None:
+        state_path = get_export_state_file()
+
+    watermark = {}
+    count = export_users(db, logger, batch_size, redact_by_column,
+                         since=read_watermark(state_path),
+                         watermark=watermark)
+    flush_logger(logger)
+    if watermark.get(WATERMARK_COLUMN) is not None:
+        write_watermark(state_path, watermark[WATERMARK_COLUMN])
+    return count
+
+
+def export_partition(connect: Callable, out_path: str, offset: int,
+                     limit: int, order_by: Sequence[str], batch_size: int,
+                     redact_by_column: bool) -> int:
+    """
+    Export one offset range of the users table to a file. Runs in a
+    worker process with its own connection.
+
+    Args:
+        connect (Callable): Factory opening a new connection.
+        out_path (str): File the formatted log lines are written to.
+        offset (int): Number of sorted rows to skip.
+        limit (int): Number of rows in the range.
+        order_by (Sequence[str]): Columns the rows are sorted by.
+        batch_size (int): Rows per fetchmany call.
+        redact_by_column (bool): See export_users.
+
+    Returns:
+        int: The number of rows exported.
+    """
+    logger = logging.Logger("user_data", logging.INFO)
+    handler = logging.FileHandler(out_path)
+    handler.setFormatter(RedactingFormatter(list(PII_FIELDS)))
+    logger.addHandler(handler)
+
+    db = connect()
+    try:
+        return export_users(db, logger, batch_size, redact_by_column,
+                            order_by=order_by, offset=offset, limit=limit)
+    finally:
+        db.close()
+        handler.close()
+
+
+def export_users_parallel(workers: int = None, batch_size: int = None,
+                          redact_by_column: bool = True, out=None,
+                          connect: Callable = connect_db,
+                          order_by: Sequence[str] = None) -> int:
+    """
+    Split the users table into offset ranges, export each range in its
+    own process with its own connection, and merge the outputs in range
+    order.
+
+    The users table has no primary key, so the ranges are taken over
+    the rows sorted by every column unless order_by names a key.
+
+    Each range is read by its own LIMIT/OFFSET query in its own
+    transaction, so the ranges are not one consistent snapshot: rows
+    inserted or deleted while the export runs shift the offsets of the
+    ranges read after the change, which can export a row twice or skip
+    one. Run it against a table that is not being written to, such as a
+    replica or a quiesced copy, when an exact export matters.
+
+    Args:
+        workers (int): Number of worker processes and of ranges;
+        defaults to os.cpu_count().
+        batch_size (int): Rows per fetchmany call.
+        redact_by_column (bool): See export_users.
+        out: Text stream the merged output goes to; defaults to
+        sys.stderr, like the get_logger StreamHandler.
+        connect (Callable): Picklable factory opening a new connection.
+        order_by (Sequence[str]): Columns giving the rows a stable order.
+
+    Returns:
+        int: The number of rows exported.
+    """
+    workers = workers or os.cpu_count() or 1
+    if batch_size is None:
+        batch_size = get_export_batch_size()
+    if out is None:
+        out = sys.stderr
+
+    db = connect()
+    try:
+        cursor = db.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users;")
+        total = cursor.fetchall()[0][0]
+        cursor.execute("SELECT * FROM users LIMIT 0;")
+        field_names = [field[0] for field in cursor.description]
+        cursor.fetchall()
+        cursor.close()
+    finally:
+        db.close()
+    if not order_by:
+        order_by = field_names
+
+    size = -(-total // workers) if total else 0
+    ranges = [(offset, size) for offset in range(0, total, size or 1)]
+    paths = []
+    for _ in ranges:
+        fd, path = tempfile.mkstemp(prefix=".export_part")
+        os.close(fd)
+        paths.append(path)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(export_partition, connect, path,
+                                       offset, limit, order_by, batch_size,
+                                       redact_by_column)
+                       for path, (offset, limit) in zip(paths, ranges)]
+            count = sum(future.result() for future in futures)
+        for path in paths:
+            with open(path, 'r') as f:
+                shutil.copyfileobj(f, out)
+        out.flush()
+    finally:
+        for path in paths:
+            os.unlink(path)
+    return count
+
+
+def get_logger(queued: bool = False, queue_size: int = LOG_QUEUE_SIZE,
+               overflow: str = "block", json_lines: bool = False,
+               log_file: str = None,
+               compress_logs: bool = False) -> logging.Logger:
     """
     Create and configure a logger for user data.
 
+    The logger is configured once; later calls return it unchanged
+    instead of stacking another handler.
+
+    Args:
+        queued (bool): Redact and write records on a background thread
+        through a bounded queue instead of on the calling thread.
+        queue_size (int): Maximum number of pending records when queued.
+        overflow (str): Policy applied when the queue is full, one of
+        LOG_OVERFLOW_POLICIES.
+        json_lines (bool): Write one JSON object per record.
+        log_file (str): Write to this size-rotated, buffered file (see
+        BufferedRotatingFileHandler) instead of stderr.
+        compress_logs (bool): Gzip the rotated segments of log_file.
+
     Returns:
         logging.Logger: Configured logger instance.
     """
+    global _log_listener
+
     logger = logging.getLogger("user_data")
+    if logger.handlers:
+        return logger
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-    stream_handler = logging.StreamHandler()
+    if log_file is not None:
+        stream_handler = BufferedRotatingFileHandler(log_file,
+                                                     compress=compress_logs)
+    else:
+        stream_handler = logging.StreamHandler()
     stream_handler.setLevel(logging.INFO)
 
-    formatter = RedactingFormatter(list(PII_FIELDS))
+    formatter = RedactingFormatter(list(PII_FIELDS), json_lines)
     stream_handler.setFormatter(formatter)
 
-    logger.addHandler(stream_handler)
+    if not queued:
+        logger.addHandler(stream_handler)
+        return logger
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    logger.addHandler(BoundedQueueHandler(log_queue, overflow))
+    _log_listener = BackgroundQueueListener(log_queue, stream_handler,
+                                            respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logger)
     return logger
 
 
-def main() -> None:
+def flush_logger(logger: logging.Logger) -> None:
+    """
+    Wait until every record logged so far was written, then flush the
+    handlers: for a queued logger, wait for the listener to handle every
+    queued record and flush the handlers it writes to.
+
+    Args:
+        logger (logging.Logger): The logger to flush.
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, QueueHandler):
+            handler.queue.join()
+            if _log_listener is not None and \
+                    _log_listener.queue is handler.queue:
+                for target in _log_listener.handlers:
+                    target.flush()
+        handler.flush()
+
+
+def stop_logger() -> None:
+    """
+    Detach the queue handler from the user_data logger, drain the
+    background queue, stop its listener thread and flush and close the
+    handlers it wrote to. The next get_logger call configures the logger
+    again.
+    """
+    global _log_listener
+
+    if _log_listener is None:
+        return
+    logger = logging.getLogger("user_data")
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler):
+            logger.removeHandler(handler)
+            handler.close()
+    _log_listener.stop()
+    for handler in _log_listener.handlers:
+        handler.flush()
+        handler.close()
+    _log_listener = None
+
+
+def main(redact_by_column: bool = True, batch_size: int = None,
+         incremental: bool = False, workers: int = 1) -> None:
     """
-    Connect to the database, retrieve all rows from
-    the users table,
+    Connect to the database, stream all rows from
+    the users table in fetchmany batches,
     and log each row with sensitive data redacted.
+
+    Args:
+        redact_by_column (bool): Redact the PII columns by position
+        before the message is built (no regex). When False, the full
+        message is built and RedactingFormatter scans it instead.
+        batch_size (int): Rows per fetchmany call; defaults to
+        PERSONAL_DATA_EXPORT_BATCH_SIZE.
+        incremental (bool): Only export the rows newer than the
+        last_login watermark (see export_users_incremental).
+        workers (int): Export a full dump with this many processes
+        (see export_users_parallel).
     """
+    if workers > 1 and not incremental:
+        export_users_parallel(workers, batch_size, redact_by_column)
+        return
+
     db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM users;")
+    try:
+        if incremental:
+            export_users_incremental(db, get_logger(),
+                                     batch_size=batch_size,
+                                     redact_by_column=redact_by_column)
+        else:
+            export_users(db, get_logger(), batch_size, redact_by_column)
+    finally:
+        db.close()
+
 
-    field_names = [field[0] for field in cursor.description]
-    logger = get_logger()
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """
+    Parse the command-line arguments.
 
-    for row in cursor:
-        log_message_parts = [
-            f'{field}={str(value)}; '
-            for value, field in zip(row, field_names)
-        ]
-        log_message = ''.join(log_message_parts)
-        logger.info(log_message.strip())
+    Args:
+        argv (List[str]): Arguments, defaults to sys.argv[1:].
 
-    cursor.close()
-    db.close()
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Log the users table with PII redacted.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only export rows newer than the watermark")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used for a full dump")
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
-    main()
+    main(**vars(parse_args()))
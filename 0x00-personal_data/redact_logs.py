@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Command-line tool for redacting PII from existing log files in parallel.
+
+Each input file is memory-mapped and split into line-aligned chunks that
+are redacted in a process pool with the same semantics as filter_datum.
+The chunks are written back in their original order.
+"""
+import argparse
+import mmap
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, \
+    get_redaction_engine
+
+CHUNK_SIZE = 8 * 1024 * 1024
+OUTPUT_SUFFIX = ".redacted"
+
+
+def chunk_boundaries(path: str, chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Split a file into byte ranges that start and end on line boundaries.
+
+    Args:
+        path (str): Path to the log file.
+        chunk_size (int): Approximate size of each range in bytes.
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) offsets covering the file.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    boundaries = []
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                newline = mm.find(b'\n', end - 1)
+                end = size if newline == -1 else newline + 1
+            boundaries.append((start, end))
+            start = end
+    return boundaries
+
+
+def redact_chunk(path: str, start: int, end: int, fields: Tuple[str, ...],
+                 redaction: str, separator: str) -> Tuple[bytes, int]:
+    """
+    Redact one line-aligned chunk of a log file.
+
+    The chunk is redacted with a single scan: the redaction pattern never
+    matches across a newline, so lines stay independent.
+
+    Args:
+        path (str): Path to the log file.
+        start (int): Offset of the first byte of the chunk.
+        end (int): Offset just past the last byte of the chunk.
+        fields (Tuple[str, ...]): Fields whose values are redacted.
+        redaction (str): The string to replace the field values with.
+        separator (str): The character that separates
+        key-value pairs in the message.
+
+    Returns:
+        Tuple[bytes, int]: The redacted chunk and its number of lines.
+    """
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = mm[start:end]
+
+    engine = get_redaction_engine(fields, redaction, separator)
+    text = data.decode('utf-8', errors='surrogateescape')
+    redacted = engine.redact(text).encode('utf-8', errors='surrogateescape')
+    return redacted, data.count(b'\n')
+
+
+def redact_file(executor: ProcessPoolExecutor, in_path: str, out_path: str,
+                fields: Tuple[str, ...], redaction: str, separator: str,
+                chunk_size: int, workers: int) -> Tuple[int, int]:
+    """
+    Redact a whole file, keeping at most 2 * workers chunks in flight.
+
+    The redacted copy is written to a temporary file next to out_path that
+    replaces it once complete, so out_path may be in_path itself.
+
+    Args:
+        executor (ProcessPoolExecutor): Pool the chunks are redacted in.
+        in_path (str): Path to the log file.
+        out_path (str): Path the redacted log file is written to.
+        fields (Tuple[str, ...]): Fields whose values are redacted.
+        redaction (str): The string to replace the field values with.
+        separator (str): The character that separates
+        key-value pairs in the message.
+        chunk_size (int): Approximate size of each chunk in bytes.
+        workers (int): Number of worker processes.
+
+    Returns:
+        Tuple[int, int]: Bytes read and lines redacted.
+    """
+    pending = deque()
+    total_bytes = 0
+    total_lines = 0
+
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(out_path) + ".",
+        suffix=".tmp", dir=os.path.dirname(os.path.abspath(out_path)))
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for start, end in chunk_boundaries(in_path, chunk_size):
+                if len(pending) >= 2 * workers:
+                    data, lines = pending.popleft().result()
+                    out.write(data)
+                    total_lines += lines
+                pending.append(executor.submit(redact_chunk, in_path, start,
+                                               end, fields, redaction,
+                                               separator))
+                total_bytes += end - start
+            while pending:
+                data, lines = pending.popleft().result()
+                out.write(data)
+                total_lines += lines
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return total_bytes, total_lines
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """
+    Parse the command-line arguments.
+
+    Args:
+        argv (List[str]): Arguments, defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Redact PII fields from existing log files.")
+    parser.add_argument("inputs", nargs="+", help="log files to redact")
+    parser.add_argument("-o", "--output-dir",
+                        help="directory for the redacted files "
+                             f"(default: next to the input, with a "
+                             f"{OUTPUT_SUFFIX} suffix)")
+    parser.add_argument("-w", "--workers", type=int,
+                        default=os.cpu_count() or 1,
+                        help="number of worker processes")
+    parser.add_argument("--fields", default=",".join(PII_FIELDS),
+                        help="comma-separated fields to redact")
+    parser.add_argument("--redaction", default=RedactingFormatter.REDACTION,
+                        help="replacement for redacted values")
+    parser.add_argument("--separator", default=RedactingFormatter.SEPARATOR,
+                        help="separator between key-value pairs")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="approximate chunk size in bytes")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    return args
+
+
+def output_path(in_path: str, output_dir: str = None) -> str:
+    """
+    Compute where the redacted copy of a log file is written.
+
+    Args:
+        in_path (str): Path to the log file.
+        output_dir (str): Directory for the redacted files, if any.
+
+    Returns:
+        str: Path of the redacted file.
+    """
+    if output_dir is None:
+        return in_path + OUTPUT_SUFFIX
+    return os.path.join(output_dir, os.path.basename(in_path))
+
+
+def main(argv: List[str] = None) -> None:
+    """
+    Redact every input file and report the throughput on stderr.
+
+    Args:
+        argv (List[str]): Arguments, defaults to sys.argv[1:].
+    """
+    args = parse_args(argv)
+    fields = tuple(field for field in args.fields.split(",") if field)
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    total_bytes = 0
+    total_lines = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for in_path in args.inputs:
+            out_path = output_path(in_path, args.output_dir)
+            n_bytes, n_lines = redact_file(
+                executor, in_path, out_path, fields, args.redaction,
+                args.separator, args.chunk_size, args.workers)
+            total_bytes += n_bytes
+            total_lines += n_lines
+            print(f"{in_path} -> {out_path}: {n_lines} lines",
+                  file=sys.stderr)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"{total_lines} lines, {total_bytes / 1e6:.1f} MB in "
+          f"{elapsed:.2f}s ({total_lines / elapsed:.0f} lines/s, "
+          f"{total_bytes / 1e6 / elapsed:.1f} MB/s) with "
+          f"{args.workers} workers", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,13 +7,48 @@ authentication, and sets up error handlers and request validation.
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import CORS
+from models.base import storage
+from models.codec import dumps, loads
 import os
 from os import getenv
 
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = None
+
 app = Flask(__name__)
-app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
+app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
+
+if DefaultJSONProvider is not None:
+    class CodecJSONProvider(DefaultJSONProvider):
+        """
+        JSON provider that encodes responses with models.codec, compact
+        and with keys in insertion order.
+        """
+        compact = True
+        sort_keys = False
+
+        def dumps(self, obj, **kwargs) -> str:
+            """
+            Serialize obj with the codec, or with Flask's encoder for the
+            types the codec rejects.
+            """
+            try:
+                return dumps(obj).decode('utf-8')
+            except TypeError:
+                return super().dumps(obj, **kwargs)
+
+        def loads(self, s, **kwargs):
+            """
+            Deserialize a JSON request body with the codec.
+            """
+            return loads(s)
+
+    app.json = CodecJSONProvider(app)
 app.register_blueprint(app_views)
-CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
+CORS(app, resources={r"/api/v1/*": {"origins": "*"}},
+     expose_headers=["X-Next-Cursor"])
 
 auth = None
 AUTH_TYPE = getenv("AUTH_TYPE")
@@ -86,6 +121,14 @@ def before_request() -> str:
 
     request.current_user = current_user
 
+@app.teardown_appcontext
+def close_storage(error) -> None:
+    """
+    Teardown handler releasing what the storage engine holds for the
+    request thread, such as its SQLite connection.
+    """
+    storage.close()
+
 if __name__ == "__main__":
     host = getenv("API_HOST", "0.0.0.0")
     port = getenv("API_PORT", "5000")
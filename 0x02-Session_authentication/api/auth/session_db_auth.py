@@ -27,7 +27,6 @@ class SessionDBAuth(SessionExpAuth):
         kwargs = {'user_id': user_id, 'session_id': session_id}
         user_session = UserSession(**kwargs)
         user_session.save()
-        UserSession.save_to_file()
 
         return session_id
 
@@ -44,7 +43,7 @@ class SessionDBAuth(SessionExpAuth):
         if session_id is None:
             return None
 
-        UserSession.load_from_file()
+        UserSession.reload()
         user_session = UserSession.search({
             'session_id': session_id
         })
@@ -95,7 +94,6 @@ class SessionDBAuth(SessionExpAuth):
 
         try:
             user_session.remove()
-            UserSession.save_to_file()
         except Exception:
             return False
 
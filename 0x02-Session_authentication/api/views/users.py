@@ -3,19 +3,113 @@
 Module for User views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request
+from models.codec import dumps, loads
 from models.user import User
+from typing import Iterable, Iterator, Tuple
+import base64
+import binascii
+
+USERS_PAGE_SIZE = 100
+USERS_PAGE_MAX = 1000
+
+
+def encode_cursor(key: Tuple[str, str]) -> str:
+    """
+    Encode a keyset cursor key as an opaque URL-safe string.
+
+    Args:
+        key (Tuple[str, str]): The cursor_key() of the last user returned.
+
+    Returns:
+        str: The opaque cursor.
+    """
+    return base64.urlsafe_b64encode(dumps(list(key))).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decode an opaque cursor made by encode_cursor.
+
+    Args:
+        cursor (str): The opaque cursor.
+
+    Returns:
+        Tuple[str, str]: The cursor key, or None if the cursor is invalid.
+    """
+    try:
+        key = loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, binascii.Error):
+        return None
+    if type(key) is not list or len(key) != 2 or \
+            not all(type(part) is str for part in key):
+        return None
+    return tuple(key)
+
+
+def stream_users(users: Iterable[User]) -> Iterator[bytes]:
+    """
+    Serialize users as a JSON list, one user at a time.
+
+    Args:
+        users (Iterable[User]): The users.
+
+    Returns:
+        Iterator[bytes]: The chunks of the JSON list.
+    """
+    separator = b"["
+    for user in users:
+        yield separator + dumps(user.to_json())
+        separator = b","
+    yield b"[]\n" if separator == b"[" else b"]\n"
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """
     Handle GET requests to /api/v1/users.
+
+    Query parameters:
+        - limit: page size, USERS_PAGE_SIZE by default and at most
+          USERS_PAGE_MAX.
+        - cursor: the X-Next-Cursor header of the previous page.
+
+    Without either parameter, every user is streamed in one response.
     
     Returns:
-        - JSON list of all User objects.
+        - JSON list of User objects, ordered by created_at then ID, with
+          the cursor of the next page in the X-Next-Cursor header when
+          there is one.
+        - 400 error if limit or cursor is invalid.
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        return Response(stream_users(User.all()), mimetype='application/json')
+
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        if after is None:
+            return jsonify({"error": "invalid cursor"}), 400
+
+    if limit is None:
+        limit = USERS_PAGE_SIZE
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return jsonify({"error": "invalid limit"}), 400
+        if not 0 < limit <= USERS_PAGE_MAX:
+            return jsonify({"error": "invalid limit"}), 400
+
+    # One extra user tells whether there is a next page
+    users = list(User.all(limit=limit + 1, after=after))
+    page = users[:limit]
+    response = jsonify([user.to_json() for user in page])
+    if len(users) > len(page):
+        cursor = encode_cursor(page[-1].cursor_key())
+        response.headers['X-Next-Cursor'] = cursor
+    return response
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
 def view_one_user(user_id: str = None) -> str:
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Main file: concurrency check of the file storage engine.
+
+Several processes save users into the same storage directory while
+compacting the journal and reloading each other's writes; at the end
+every save must be visible, both to a process reloading a stale state
+and to a fresh load.
+"""
+import os
+import sys
+import tempfile
+from multiprocessing import Process
+
+WORKERS = 4
+SAVES = 200
+COMPACT_THRESHOLD = 25
+SAVE_TO_FILE_EVERY = 30
+RELOAD_EVERY = 7
+
+
+def work(worker: int):
+    """
+    Save users, compacting and reloading the storage along the way.
+
+    Args:
+        worker (int): Number of the worker, used in the user emails.
+    """
+    import models.base
+    models.base.JOURNAL_COMPACT_THRESHOLD = COMPACT_THRESHOLD
+    from models.user import User
+
+    User.load_from_file()
+    for i in range(SAVES):
+        User(email=f"worker{worker}-{i}@example.com").save()
+        if i % SAVE_TO_FILE_EVERY == 0:
+            User.save_to_file()
+        if i % RELOAD_EVERY == 0:
+            User.reload()
+
+
+if __name__ == '__main__':
+    os.chdir(tempfile.mkdtemp())
+    from models.user import User
+
+    User.load_from_file()
+    print("before:", User.count())
+
+    workers = [Process(target=work, args=(n,)) for n in range(WORKERS)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    expected = WORKERS * SAVES
+    User.reload()
+    reloaded = User.count()
+    User.load_from_file()
+    loaded = len({user.email for user in User.all()})
+    print("reloaded:", reloaded)
+    print("loaded:", loaded)
+    print("files:", sorted(os.listdir('.')))
+    if any(process.exitcode for process in workers) or \
+            reloaded != expected or loaded != expected:
+        print(f"FAIL: expected {expected} users")
+        sys.exit(1)
+    print("OK")
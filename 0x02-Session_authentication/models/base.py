@@ -3,20 +3,164 @@
 """
 Base module for handling core functionalities of model classes.
 """
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
-import json
+from typing import TypeVar, BinaryIO, List, Iterable, Iterator, Tuple
+from os import getenv, path
+from bisect import bisect_left, bisect_right, insort
+from models.codec import SNAPSHOT_FORMAT, SNAPSHOT_FORMATS, dumps, loads, \
+    encode_snapshot, decode_snapshot
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import time
 import uuid
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+JOURNAL_ENTRIES = {}
+JOURNAL_COMPACT_THRESHOLD = 1000
+INDEXES = {}
+INDEXED_VALUES = {}
+ORDER = {}
+ORDER_KEYS = {}
+PENDING = {}
+LOAD_STATS = {}
+FILE_STATE = {}
+LOCK_FILES = {}
+FSYNC_POLICIES = ("always", "snapshot", "never")
+FSYNC_POLICY = getenv("MODELS_FSYNC", "snapshot")
+WRITE_BEHIND_INTERVAL = 1.0
+WRITE_BEHIND_MAX_DIRTY = 500
+STORAGE_ENGINES = ("file", "sqlite")
+STORAGE_ENGINE = getenv("MODELS_STORAGE", "file")
+if FSYNC_POLICY not in FSYNC_POLICIES:
+    raise ValueError(f"unknown MODELS_FSYNC: {FSYNC_POLICY}")
+_file_lock = threading.RLock()
+_flush_requested = threading.Event()
+_flusher = None
+logger = logging.getLogger(__name__)
+
+
+class LazyObjects(MutableMapping):
+    """
+    Mapping of object ID to model object that keeps the raw JSON records
+    of a file and builds each object the first time it is read.
+    """
+
+    def __init__(self, cls: type, records: dict):
+        """
+        Initialize the mapping from raw records.
+
+        Args:
+            cls (type): The model class the records are built into.
+            records (dict): Raw JSON records by object ID.
+        """
+        self.cls = cls
+        self._data = records
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """
+        Return an object, building it from its raw record if needed.
+        """
+        value = self._data[obj_id]
+        if type(value) is dict:
+            value = self._data[obj_id] = self.cls.from_records([value])[0]
+        return value
+
+    def __setitem__(self, obj_id: str, obj: TypeVar('Base')):
+        """
+        Store an object, or a raw record to build later.
+        """
+        self._data[obj_id] = obj
+
+    def __delitem__(self, obj_id: str):
+        """
+        Remove an object.
+        """
+        del self._data[obj_id]
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterate over the object IDs without building any object.
+        """
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        """
+        Count the objects without building any.
+        """
+        return len(self._data)
+
+    def __contains__(self, obj_id: object) -> bool:
+        """
+        Check for an object ID without building the object.
+        """
+        return obj_id in self._data
+
+    def peek_items(self) -> Iterable[Tuple[str, object]]:
+        """
+        Iterate over (ID, object or raw record) pairs without building.
+        """
+        return self._data.items()
+
 
 class Base:
     """
     Base class for providing common functionalities to model classes.
+
+    Objects are persisted by the storage engine selected with the
+    MODELS_STORAGE environment variable: "file" (FileStorage, the
+    default) or "sqlite" (SQLiteStorage).
+
+    Subclasses list the attributes searched by equality in
+    INDEXED_ATTRIBUTES to get an index on each of them.
+
+    DURABILITY is "strict" (each save or remove is journaled before it
+    returns) or "relaxed" (write-behind: mutations are coalesced in memory
+    and journaled by a background thread every WRITE_BEHIND_INTERVAL
+    seconds, once WRITE_BEHIND_MAX_DIRTY objects are pending, and at exit).
+
+    With LAZY_LOAD, load_from_file keeps the raw records and builds each
+    object only when get, search or all first touches it.
+
+    DURABILITY and LAZY_LOAD only apply to the file engine.
+
+    With BULK_LOAD, the file engine builds loaded objects with
+    from_records, which bypasses __init__; a subclass whose __init__ does
+    more than copy its fields from the keyword arguments turns it off.
+
+    Instances are slotted: every class declares its attributes in
+    __slots__, and FIELDS lists them all, in declaration order, so that
+    to_json needs no per-instance __dict__.
     """
 
+    __slots__ = ('id', 'created_at', 'updated_at')
+    FIELDS = __slots__
+    TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+    INDEXED_ATTRIBUTES = ()
+    DURABILITY = "strict"
+    LAZY_LOAD = False
+    BULK_LOAD = True
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Precompute FIELDS from the __slots__ of the class and its bases.
+        """
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            fields.extend(klass.__dict__.get('__slots__', ()))
+        cls.FIELDS = tuple(fields)
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a new instance of Base.
@@ -25,13 +169,13 @@ class Base:
             *args (list): Variable length argument list.
             **kwargs (dict): Arbitrary keyword arguments.
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
-        self.id = kwargs.get('id', str(uuid.uuid4()))
-        self.created_at = datetime.strptime(kwargs.get('created_at'), TIMESTAMP_FORMAT) if kwargs.get('created_at') else datetime.utcnow()
-        self.updated_at = datetime.strptime(kwargs.get('updated_at'), TIMESTAMP_FORMAT) if kwargs.get('updated_at') else datetime.utcnow()
+        self.id = kwargs.get('id') or str(uuid.uuid4())
+        created_at = kwargs.get('created_at')
+        updated_at = kwargs.get('updated_at')
+        self.created_at = datetime.fromisoformat(created_at) \
+            if created_at else datetime.utcnow()
+        self.updated_at = datetime.fromisoformat(updated_at) \
+            if updated_at else datetime.utcnow()
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """
@@ -58,60 +202,88 @@ class Base:
             dict: JSON-serializable dictionary representation of the instance.
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key in self.FIELDS:
             if not for_serialization and key.startswith('_'):
                 continue
-            if isinstance(value, datetime):
+            value = getattr(self, key)
+            if key in self.TIMESTAMP_FIELDS:
                 result[key] = value.strftime(TIMESTAMP_FORMAT)
             else:
                 result[key] = value
         return result
 
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> List[TypeVar('Base')]:
+        """
+        Build objects from their serialized records.
+
+        Each field is read from its record once and stored straight into
+        its slot, and the timestamps are parsed with the C ISO parser
+        instead of strptime.
+
+        Args:
+            records (Iterable[dict]): Records written by to_json(True).
+
+        Returns:
+            List[Base]: The objects, in the order of the records.
+        """
+        if not cls.BULK_LOAD:
+            return [cls(**record) for record in records]
+
+        new = cls.__new__
+        fromisoformat = datetime.fromisoformat
+        now = datetime.utcnow()
+        fields = [(field, getattr(cls, field).__set__) for field in cls.FIELDS
+                  if field not in cls.TIMESTAMP_FIELDS]
+        timestamps = [(field, getattr(cls, field).__set__)
+                      for field in cls.TIMESTAMP_FIELDS]
+        objs = []
+        for record in records:
+            obj = new(cls)
+            for field, set_field in fields:
+                set_field(obj, record.get(field))
+            for field, set_field in timestamps:
+                value = record.get(field)
+                set_field(obj, fromisoformat(value) if value else now)
+            if not obj.id:
+                obj.id = str(uuid.uuid4())
+            objs.append(obj)
+        return objs
+
     @classmethod
     def load_from_file(cls):
         """
-        Load all objects of the class from a JSON file.
+        Load all objects of the class from the storage engine.
         """
-        s_class = cls.__name__
-        file_path = f".db_{s_class}.json"
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        storage.load(cls)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def reload(cls):
+        """
+        Bring the objects of the class up to date with the changes other
+        processes made to the storage engine since they were loaded.
+        """
+        storage.reload(cls)
 
     @classmethod
     def save_to_file(cls):
         """
-        Save all objects of the class to a JSON file.
+        Write all objects of the class to the storage engine.
         """
-        s_class = cls.__name__
-        file_path = f".db_{s_class}.json"
-        objs_json = {obj_id: obj.to_json(True) for obj_id, obj in DATA[s_class].items()}
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        storage.dump(cls)
 
     def save(self):
         """
-        Save the current instance to the data store and file.
+        Save the current instance to the storage engine.
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        storage.save(self)
 
     def remove(self):
         """
-        Remove the current instance from the data store and file.
+        Remove the current instance from the storage engine.
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id):
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        storage.remove(self)
 
     @classmethod
     def count(cls) -> int:
@@ -121,18 +293,33 @@ class Base:
         Returns:
             int: The number of objects.
         """
-        s_class = cls.__name__
-        return len(DATA[s_class])
+        return storage.count(cls)
 
     @classmethod
-    def all(cls) -> Iterable[TypeVar('Base')]:
+    def all(cls, limit: int = None,
+            after: Tuple[str, str] = None) -> Iterator[TypeVar('Base')]:
         """
-        Retrieve all objects of the class.
+        Lazily iterate over the objects of the class, ordered by
+        created_at then ID.
+
+        Args:
+            limit (int): Maximum number of objects, or None for all.
+            after (Tuple[str, str]): Keyset cursor: only the objects whose
+            cursor_key() sorts after it are returned.
 
         Returns:
-            Iterable[Base]: An iterable of all objects.
+            Iterator[Base]: An iterator over the objects.
         """
-        return cls.search()
+        return storage.iterate(cls, limit, after)
+
+    def cursor_key(self) -> Tuple[str, str]:
+        """
+        Return the key the instance is ordered by in all().
+
+        Returns:
+            Tuple[str, str]: The serialized created_at and the ID.
+        """
+        return (self.created_at.strftime(TIMESTAMP_FORMAT), self.id)
 
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
@@ -145,8 +332,7 @@ class Base:
         Returns:
             Base: The object with the given ID, or None if not found.
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return storage.get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
@@ -159,14 +345,779 @@ class Base:
         Returns:
             List[Base]: A list of matching objects.
         """
+        return storage.search(cls, attributes)
+
+    def matches(self, attributes: dict) -> bool:
+        """
+        Check that the instance has every attribute value given.
+
+        Args:
+            attributes (dict): Attributes to match against.
+
+        Returns:
+            bool: True if all attributes are equal, otherwise False.
+        """
+        for k, v in attributes.items():
+            if getattr(self, k) != v:
+                return False
+        return True
+
+
+class FileStorage:
+    """
+    Storage engine keeping every object in memory in DATA, persisted as
+    a snapshot file per class plus an append-only journal of the saves
+    and removes written since the snapshot.
+
+    Processes sharing the files coordinate with an fcntl advisory lock
+    on .db_<Class>.lock: reads take it shared, appends and compactions
+    exclusive. Snapshots are written to a temporary file that replaces
+    the old one, so a reader never sees a partial snapshot. Within a
+    process, the threads change the objects, their indexes and the files
+    only under _file_lock.
+
+    MODELS_FSYNC sets what is flushed to disk before a write returns:
+    "always" (journal appends and snapshots), "snapshot" (the default:
+    snapshots only) or "never".
+    """
+
+    @contextmanager
+    def locked(self, cls: type, exclusive: bool = False):
+        """
+        Hold the file lock of the class, shared or exclusive, together
+        with the in-process lock; nested calls reuse the lock already
+        held, upgrading it for the duration of an exclusive section.
+
+        Args:
+            cls (type): The model class.
+            exclusive (bool): Whether the files are written.
+        """
+        with _file_lock:
+            if fcntl is None:
+                yield
+                return
+
+            s_class = cls.__name__
+            lock = LOCK_FILES.get(s_class)
+            # A forked child shares the open file of its parent, and with
+            # it the flock: each process opens the lock file itself
+            if lock is None or lock['pid'] != os.getpid():
+                fd = os.open(f".db_{s_class}.lock",
+                             os.O_RDWR | os.O_CREAT, 0o644)
+                lock = LOCK_FILES[s_class] = {'fd': fd, 'pid': os.getpid(),
+                                              'depth': 0, 'exclusive': False}
+
+            upgraded = False
+            if lock['depth'] == 0:
+                fcntl.flock(lock['fd'],
+                            fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                lock['exclusive'] = exclusive
+            elif exclusive and not lock['exclusive']:
+                fcntl.flock(lock['fd'], fcntl.LOCK_EX)
+                lock['exclusive'] = upgraded = True
+            lock['depth'] += 1
+            try:
+                yield
+            finally:
+                lock['depth'] -= 1
+                if lock['depth'] == 0:
+                    fcntl.flock(lock['fd'], fcntl.LOCK_UN)
+                elif upgraded:
+                    fcntl.flock(lock['fd'], fcntl.LOCK_SH)
+                    lock['exclusive'] = False
+
+    def close(self):
+        """
+        Nothing to do: the files are only open while they are read or
+        written.
+        """
+
+    def objects(self, cls: type) -> MutableMapping:
+        """
+        Return the objects of a class by ID, creating the empty store of
+        a class that was never loaded.
+
+        Args:
+            cls (type): The model class.
+
+        Returns:
+            MutableMapping: The objects of the class.
+        """
+        return DATA.setdefault(cls.__name__, {})
+
+    def load(self, cls: type):
+        """
+        Load all objects of the class from its snapshot, then replay the
+        journal of saves and removes written since the snapshot.
+
+        The snapshot in SNAPSHOT_FORMAT is preferred; a snapshot in the
+        other format is read instead when it is the only one, so switching
+        formats keeps the data.
+
+        The number of records and the time the load took are logged and
+        kept in LOAD_STATS.
+
+        Args:
+            cls (type): The model class.
+        """
+        started = time.perf_counter()
+        self.flush_pending(cls)
         s_class = cls.__name__
 
-        def _search(obj):
-            if not attributes:
-                return True
+        with _file_lock:
+            JOURNAL_ENTRIES[s_class] = 0
+            records = {}
+            snapshot = None
+            with self.locked(cls):
+                file_path, fmt = self.find_snapshot(cls)
+                if file_path is not None:
+                    with open(file_path, 'rb') as f:
+                        snapshot = self.file_signature(file_path)
+                        records = decode_snapshot(f.read(), fmt)
+
+                journal_path = f".db_{s_class}.journal"
+                offset, journal = 0, None
+                if path.exists(journal_path):
+                    offset, journal = self.replay_journal(cls, journal_path,
+                                                          records)
+            FILE_STATE[s_class] = {'snapshot': snapshot, 'journal': journal,
+                                   'offset': offset}
+
+            if cls.LAZY_LOAD:
+                DATA[s_class] = LazyObjects(cls, records)
+            else:
+                objs = cls.from_records(records.values())
+                DATA[s_class] = dict(zip(records, objs))
+            self.rebuild_indexes(cls, records)
+
+        elapsed = time.perf_counter() - started
+        LOAD_STATS[s_class] = {'records': len(records), 'seconds': elapsed}
+        logger.info("Loaded %d %s records in %.3fs",
+                    len(records), s_class, elapsed)
+
+    def snapshot_path(self, cls: type, fmt: str = SNAPSHOT_FORMAT) -> str:
+        """
+        Return the path of the snapshot file of the class.
+
+        Args:
+            cls (type): The model class.
+            fmt (str): One of SNAPSHOT_FORMATS.
+
+        Returns:
+            str: The snapshot path.
+        """
+        return f".db_{cls.__name__}{SNAPSHOT_FORMATS[fmt]}"
+
+    def find_snapshot(self, cls: type) -> Tuple[str, str]:
+        """
+        Find the snapshot file load reads: the one in SNAPSHOT_FORMAT, or
+        else the one in another format.
+
+        Args:
+            cls (type): The model class.
+
+        Returns:
+            Tuple[str, str]: The path and format of the snapshot, or
+            (None, None) when the class has none.
+        """
+        formats = sorted(SNAPSHOT_FORMATS,
+                         key=lambda fmt: fmt != SNAPSHOT_FORMAT)
+        for fmt in formats:
+            file_path = self.snapshot_path(cls, fmt)
+            if path.exists(file_path):
+                return file_path, fmt
+        return None, None
+
+    def file_signature(self, file_path: str) -> Tuple[int, int, int]:
+        """
+        Return what identifies the version of a file.
+
+        Args:
+            file_path (str): Path to the file.
+
+        Returns:
+            Tuple[int, int, int]: The inode, size and mtime in nanoseconds,
+            or None if the file does not exist.
+        """
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def read_journal(self, journal_path: str,
+                     offset: int = 0) -> Tuple[List[dict], int, int]:
+        """
+        Read the complete journal entries that start at or after offset.
+
+        A complete line that is not valid JSON is logged and skipped, so
+        one corrupt entry does not hide the entries written after it.
+
+        Args:
+            journal_path (str): Path to the journal of the class.
+            offset (int): Offset of the first entry to read.
+
+        Returns:
+            Tuple[List[dict], int, int]: The entries, the offset just past
+            the last complete entry, and the inode of the journal.
+        """
+        entries = []
+        with open(journal_path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(loads(line))
+                except ValueError:
+                    logger.warning("Skipping corrupt entry at offset %d "
+                                   "of %s", offset, journal_path)
+                offset += len(line)
+        return entries, offset, inode
+
+    def replay_journal(self, cls: type, journal_path: str,
+                       records: dict) -> Tuple[int, int]:
+        """
+        Apply the journal entries on top of the loaded snapshot.
+
+        Args:
+            cls (type): The model class.
+            journal_path (str): Path to the journal of the class.
+            records (dict): Raw JSON records by ID, updated in place.
+
+        Returns:
+            Tuple[int, int]: The offset just past the last entry applied
+            and the inode of the journal.
+        """
+        entries, valid_size, inode = self.read_journal(journal_path)
+        for entry in entries:
+            if entry['op'] == 'save':
+                records[entry['id']] = entry['obj']
+            else:
+                records.pop(entry['id'], None)
+        JOURNAL_ENTRIES[cls.__name__] += len(entries)
+
+        # A write cut short by a crash leaves a partial last line: drop it
+        # so the next entry starts on a line of its own. Writers hold the
+        # lock exclusively, so no write can be in progress here.
+        if valid_size < path.getsize(journal_path):
+            os.truncate(journal_path, valid_size)
+        return valid_size, inode
+
+    def reload(self, cls: type):
+        """
+        Bring the objects of the class up to date with its files.
+
+        Nothing is read while the snapshot keeps its inode, size and mtime
+        and the journal has not grown. When only the journal grew, just
+        the entries appended since the last read are applied; when the
+        snapshot changed or the journal was compacted, the class is
+        loaded again.
+
+        Args:
+            cls (type): The model class.
+        """
+        self.flush_pending(cls)
+        with self.locked(cls):
+            self.catch_up(cls)
+
+    def catch_up(self, cls: type):
+        """
+        Apply the changes other processes made to the files of the class,
+        as described in reload; the caller holds the file lock.
+
+        Args:
+            cls (type): The model class.
+        """
+        s_class = cls.__name__
+        journal_path = f".db_{s_class}.journal"
+
+        state = FILE_STATE.get(s_class)
+        if state is None:
+            return self.load(cls)
+
+        file_path, _ = self.find_snapshot(cls)
+        snapshot = None
+        if file_path is not None:
+            snapshot = self.file_signature(file_path)
+        journal = self.file_signature(journal_path)
+        if snapshot != state['snapshot']:
+            return self.load(cls)
+        if journal is None:
+            if state['offset']:
+                self.load(cls)
+            return
+        if state['journal'] not in (None, journal[0]) or \
+                journal[1] < state['offset']:
+            return self.load(cls)
+        if journal[1] == state['offset']:
+            return
+
+        entries, offset, inode = self.read_journal(journal_path,
+                                                   state['offset'])
+        objects = self.objects(cls)
+        for entry in entries:
+            obj_id = entry['id']
+            if entry['op'] == 'save':
+                obj = cls.from_records([entry['obj']])[0]
+                objects[obj_id] = obj
+                self.index(cls, obj_id, obj)
+            elif obj_id in objects:
+                del objects[obj_id]
+                self.unindex(cls, obj_id)
+        JOURNAL_ENTRIES[s_class] = \
+            JOURNAL_ENTRIES.get(s_class, 0) + len(entries)
+        state['journal'] = inode
+        state['offset'] = offset
+
+    def dump(self, cls: type):
+        """
+        Compact the class: write all objects to the snapshot in
+        SNAPSHOT_FORMAT and empty the journal.
+
+        Under the exclusive lock, the changes other processes made are
+        applied first, so the snapshot never drops their writes. The
+        snapshot is written to a temporary file that atomically replaces
+        the old one. Replaying a journal over a snapshot that already
+        contains its entries gives the same objects, so a crash between
+        the replace and the truncation of the journal loses nothing.
+
+        Args:
+            cls (type): The model class.
+        """
+        s_class = cls.__name__
+        file_path = self.snapshot_path(cls)
+
+        self.flush_pending(cls)
+        with self.locked(cls, exclusive=True):
+            self.catch_up(cls)
+            objs_json = {obj_id: obj if type(obj) is dict
+                         else obj.to_json(True)
+                         for obj_id, obj in self.peek_items(cls)}
+
+            fd, tmp_path = tempfile.mkstemp(prefix=f".db_{s_class}.",
+                                            suffix=".tmp", dir=".")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(encode_snapshot(objs_json))
+                    if FSYNC_POLICY != "never":
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            if FSYNC_POLICY != "never":
+                fsync_directory(".")
+            # A snapshot left in another format is now stale
+            for fmt in SNAPSHOT_FORMATS:
+                stale_path = self.snapshot_path(cls, fmt)
+                if fmt != SNAPSHOT_FORMAT and path.exists(stale_path):
+                    os.remove(stale_path)
+
+            with open(f".db_{s_class}.journal", 'w') as f:
+                inode = os.fstat(f.fileno()).st_ino
+            JOURNAL_ENTRIES[s_class] = 0
+            FILE_STATE[s_class] = {'snapshot': self.file_signature(file_path),
+                                   'journal': inode, 'offset': 0}
+
+    def append_to_journal(self, cls: type, entries: List[dict]):
+        """
+        Append saves and removes to the journal of the class in one write,
+        and compact once the journal holds JOURNAL_COMPACT_THRESHOLD
+        entries.
+
+        Args:
+            cls (type): The model class.
+            entries (List[dict]): The journal entries, each with 'op' and
+            'id' keys and, for saves, the serialized object under 'obj'.
+        """
+        s_class = cls.__name__
+        with self.locked(cls, exclusive=True):
+            with open(f".db_{s_class}.journal", 'a+b') as f:
+                # A write cut short by a crash leaves a partial last line:
+                # drop it so the new entries start on a line of their own
+                start = self.complete_size(f)
+                if start < f.seek(0, os.SEEK_END):
+                    f.truncate(start)
+                f.write(b"".join(dumps(entry) + b"\n" for entry in entries))
+                end = f.tell()
+                inode = os.fstat(f.fileno()).st_ino
+                if FSYNC_POLICY == "always":
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            # Skip our own entries on the next reload, unless another
+            # process appended entries this process has not read yet
+            state = FILE_STATE.get(s_class)
+            if state is not None and state['offset'] == start and \
+                    state['journal'] in (None, inode):
+                state['journal'] = inode
+                state['offset'] = end
+
+            JOURNAL_ENTRIES[s_class] = \
+                JOURNAL_ENTRIES.get(s_class, 0) + len(entries)
+            if JOURNAL_ENTRIES[s_class] >= JOURNAL_COMPACT_THRESHOLD:
+                self.dump(cls)
+
+    def complete_size(self, f: BinaryIO) -> int:
+        """
+        Return the size of a journal up to the end of its last complete
+        line, reading backwards from the end of the file.
+
+        Args:
+            f (BinaryIO): The journal, opened for reading in binary mode.
+
+        Returns:
+            int: The offset just past the last newline, or 0 if none.
+        """
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                return start + newline + 1
+            end = start
+        return 0
+
+    def record_mutation(self, cls: type, obj_id: str, obj: Base = None):
+        """
+        Persist a save (obj given) or a remove (obj None) according to
+        the DURABILITY of the class.
+
+        Args:
+            cls (type): The model class.
+            obj_id (str): The ID of the mutated object.
+            obj (Base): The saved object, or None for a remove.
+        """
+        if cls.DURABILITY != "relaxed":
+            if obj is None:
+                self.append_to_journal(cls, [{'op': 'remove', 'id': obj_id}])
+            else:
+                self.append_to_journal(cls, [{'op': 'save', 'id': obj_id,
+                                              'obj': obj.to_json(True)}])
+            return
+
+        with _file_lock:
+            pending = PENDING.setdefault(cls, {})
+            pending[obj_id] = obj
+            dirty = len(pending)
+        start_flusher()
+        if dirty >= WRITE_BEHIND_MAX_DIRTY:
+            _flush_requested.set()
+
+    def flush_pending(self, cls: type):
+        """
+        Journal the write-behind mutations pending for the class, each
+        object serialized once with its latest state.
+
+        If the journal write fails, the mutations go back to PENDING for
+        the next flush, behind any state recorded since, and the error is
+        raised.
+
+        Args:
+            cls (type): The model class.
+        """
+        with _file_lock:
+            pending = PENDING.pop(cls, None)
+            if not pending:
+                return
+            try:
+                entries = []
+                for obj_id, obj in pending.items():
+                    if obj is None:
+                        entries.append({'op': 'remove', 'id': obj_id})
+                    else:
+                        entries.append({'op': 'save', 'id': obj_id,
+                                        'obj': obj.to_json(True)})
+                self.append_to_journal(cls, entries)
+            except BaseException:
+                pending.update(PENDING.get(cls, {}))
+                PENDING[cls] = pending
+                raise
+
+    def save(self, obj: Base):
+        """
+        Store an object and journal the save.
+
+        The store and its indexes are only changed under _file_lock, the
+        lock compaction and reloads hold while they read or rebuild them.
+
+        Args:
+            obj (Base): The object to save.
+        """
+        cls = obj.__class__
+        with _file_lock:
+            self.objects(cls)[obj.id] = obj
+            self.index(cls, obj.id, obj)
+            self.record_mutation(cls, obj.id, obj)
+
+    def remove(self, obj: Base):
+        """
+        Drop an object and journal the remove.
+
+        Args:
+            obj (Base): The object to remove.
+        """
+        cls = obj.__class__
+        with _file_lock:
+            objects = self.objects(cls)
+            if objects.get(obj.id):
+                del objects[obj.id]
+                self.unindex(cls, obj.id)
+                self.record_mutation(cls, obj.id)
+
+    def peek_items(self, cls: type) -> Iterable[Tuple[str, object]]:
+        """
+        Iterate over the (ID, object) pairs of the class without building
+        lazily loaded objects; those come back as their raw JSON record.
+
+        Args:
+            cls (type): The model class.
+
+        Returns:
+            Iterable[Tuple[str, object]]: The pairs, in insertion order.
+        """
+        store = self.objects(cls)
+        if isinstance(store, LazyObjects):
+            return store.peek_items()
+        return store.items()
+
+    def index(self, cls: type, obj_id: str, obj: object):
+        """
+        Add an object to the hash indexes and the ordering of the class,
+        replacing the entries for the values it was last indexed under;
+        the caller holds _file_lock.
+
+        Args:
+            cls (type): The model class.
+            obj_id (str): The ID of the object.
+            obj (object): The saved object, or its raw JSON record.
+        """
+        s_class = cls.__name__
+        self.unindex(cls, obj_id)
+        indexes = INDEXES.setdefault(s_class, {})
+        values = {}
+        for attr in cls.INDEXED_ATTRIBUTES:
+            if type(obj) is dict:
+                value = obj.get(attr)
+            else:
+                value = getattr(obj, attr, None)
+            try:
+                by_value = indexes.setdefault(attr, {})
+                by_value.setdefault(value, {})[obj_id] = True
+            except TypeError:
+                # Unhashable values are left to the scan in search()
+                continue
+            values[attr] = value
+        INDEXED_VALUES.setdefault(s_class, {})[obj_id] = values
+
+        if type(obj) is dict:
+            key = (obj.get('created_at') or '', obj_id)
+        else:
+            key = obj.cursor_key()
+        insort(ORDER.setdefault(s_class, []), key)
+        ORDER_KEYS.setdefault(s_class, {})[obj_id] = key
+
+    def unindex(self, cls: type, obj_id: str):
+        """
+        Remove an object from the hash indexes and the ordering of the
+        class; the caller holds _file_lock.
+
+        Args:
+            cls (type): The model class.
+            obj_id (str): The ID of the object.
+        """
+        s_class = cls.__name__
+        key = ORDER_KEYS.get(s_class, {}).pop(obj_id, None)
+        if key is not None:
+            order = ORDER[s_class]
+            del order[bisect_left(order, key)]
+
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, None)
+        if not values:
+            return
+        for attr, value in values.items():
+            bucket = INDEXES[s_class][attr][value]
+            bucket.pop(obj_id, None)
+            if not bucket:
+                del INDEXES[s_class][attr][value]
+
+    def rebuild_indexes(self, cls: type, records: dict):
+        """
+        Index every object of the class from scratch, from the records it
+        was loaded from; the ordering is sorted once at the end.
+
+        Args:
+            cls (type): The model class.
+            records (dict): Raw JSON records by ID.
+        """
+        indexes = {attr: {} for attr in cls.INDEXED_ATTRIBUTES}
+        indexed_values = {}
+        order_keys = {}
+        for obj_id, record in records.items():
+            values = {}
+            for attr, index in indexes.items():
+                value = record.get(attr)
+                try:
+                    index.setdefault(value, {})[obj_id] = True
+                except TypeError:
+                    # Unhashable values are left to the scan in search()
+                    continue
+                values[attr] = value
+            indexed_values[obj_id] = values
+            order_keys[obj_id] = (record.get('created_at') or '', obj_id)
+
+        s_class = cls.__name__
+        INDEXES[s_class] = indexes
+        INDEXED_VALUES[s_class] = indexed_values
+        ORDER_KEYS[s_class] = order_keys
+        ORDER[s_class] = sorted(order_keys.values())
+
+    def count(self, cls: type) -> int:
+        """
+        Count the objects of the class.
+
+        Args:
+            cls (type): The model class.
+
+        Returns:
+            int: The number of objects.
+        """
+        return len(self.objects(cls))
+
+    def get(self, cls: type, obj_id: str) -> Base:
+        """
+        Retrieve an object of the class by ID.
+
+        Args:
+            cls (type): The model class.
+            obj_id (str): The ID of the object.
+
+        Returns:
+            Base: The object, or None if not found.
+        """
+        return self.objects(cls).get(obj_id)
+
+    def iterate(self, cls: type, limit: int = None,
+                after: Tuple[str, str] = None) -> Iterator[Base]:
+        """
+        Lazily iterate over the objects of the class in cursor_key()
+        order, using the ordering kept sorted by index().
+
+        Args:
+            cls (type): The model class.
+            limit (int): Maximum number of objects, or None for all.
+            after (Tuple[str, str]): Only return the objects after it.
+
+        Returns:
+            Iterator[Base]: An iterator over the objects.
+        """
+        order = ORDER.get(cls.__name__, [])
+        start = 0 if after is None else bisect_right(order, tuple(after))
+        end = len(order) if limit is None else start + limit
+        objects = self.objects(cls)
+        for _, obj_id in order[start:end]:
+            obj = objects.get(obj_id)
+            if obj is not None:
+                yield obj
+
+    def search(self, cls: type, attributes: dict) -> List[Base]:
+        """
+        Search for objects of the class matching specific attributes.
+
+        When an attribute is in INDEXED_ATTRIBUTES, only the objects under
+        its value in the hash index are checked; otherwise every object is.
+
+        Args:
+            cls (type): The model class.
+            attributes (dict): Attributes to match against.
+
+        Returns:
+            List[Base]: A list of matching objects.
+        """
+        s_class = cls.__name__
+        objects = self.objects(cls)
+
+        with _file_lock:
+            candidates = None
             for k, v in attributes.items():
-                if getattr(obj, k) != v:
-                    return False
-            return True
+                if k in cls.INDEXED_ATTRIBUTES and s_class in INDEXES:
+                    try:
+                        obj_ids = INDEXES[s_class][k].get(v, {})
+                    except TypeError:
+                        continue
+                    candidates = [objects[obj_id] for obj_id in obj_ids]
+                    break
+            if candidates is None:
+                candidates = list(objects.values())
+
+        if not attributes:
+            return candidates
+        return [obj for obj in candidates if obj.matches(attributes)]
+
+
+def fsync_directory(dir_path: str):
+    """
+    Flush a directory to disk, making the renames in it durable.
+
+    Args:
+        dir_path (str): Path to the directory.
+    """
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def flush_all():
+    """
+    Journal the pending write-behind mutations of every class.
+    """
+    for cls in list(PENDING):
+        storage.flush_pending(cls)
+
+
+def _write_behind_loop():
+    """
+    Background loop flushing pending mutations on every interval, or
+    sooner when a class reaches WRITE_BEHIND_MAX_DIRTY pending objects.
+    A failed flush is logged and retried on the next interval.
+    """
+    while True:
+        _flush_requested.wait(WRITE_BEHIND_INTERVAL)
+        _flush_requested.clear()
+        for cls in list(PENDING):
+            try:
+                storage.flush_pending(cls)
+            except Exception:
+                logger.exception("Write-behind flush of %s failed",
+                                 cls.__name__)
+
+
+def start_flusher():
+    """
+    Start the write-behind thread once, and flush at interpreter exit.
+    """
+    global _flusher
+
+    if _flusher is not None:
+        return
+    with _file_lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_write_behind_loop, daemon=True)
+        _flusher.start()
+        atexit.register(flush_all)
+
 
-        return list(filter(_search, DATA[s_class].values()))
+if STORAGE_ENGINE == "file":
+    storage = FileStorage()
+elif STORAGE_ENGINE == "sqlite":
+    from models.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage(getenv("MODELS_SQLITE_PATH", ".db_models.sqlite3"))
+else:
+    raise ValueError(f"unknown MODELS_STORAGE: {STORAGE_ENGINE}")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+Codec module: encodes and decodes the model files and the API payloads
+with the fastest JSON backend installed, falling back to the stdlib.
+"""
+from os import getenv
+import json
+import marshal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+SNAPSHOT_FORMATS = {"json": ".json", "binary": ".bin"}
+SNAPSHOT_FORMAT = getenv("MODELS_SNAPSHOT_FORMAT", "json")
+if SNAPSHOT_FORMAT not in SNAPSHOT_FORMATS:
+    raise ValueError(f"unknown MODELS_SNAPSHOT_FORMAT: {SNAPSHOT_FORMAT}")
+
+
+def dumps(obj: object) -> bytes:
+    """
+    Serialize an object to compact UTF-8 JSON.
+
+    Args:
+        obj (object): The object to serialize.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # Types orjson rejects (e.g. ints over 64 bits, non-str keys)
+            # go through the stdlib encoder instead
+            pass
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data: bytes) -> object:
+    """
+    Deserialize a JSON document.
+
+    Args:
+        data (bytes): The JSON document, as bytes or str.
+
+    Returns:
+        object: The deserialized object.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_snapshot(records: dict, fmt: str = SNAPSHOT_FORMAT) -> bytes:
+    """
+    Encode the records of a model snapshot file.
+
+    The binary format uses marshal: it only holds the plain dicts, strings
+    and None of the records, and loads faster than any JSON parser, but
+    it is tied to the Python version that wrote it.
+
+    Args:
+        records (dict): Serialized objects by ID.
+        fmt (str): One of SNAPSHOT_FORMATS.
+
+    Returns:
+        bytes: The snapshot file content.
+    """
+    if fmt == "binary":
+        return marshal.dumps(records)
+    return dumps(records)
+
+
+def decode_snapshot(data: bytes, fmt: str = SNAPSHOT_FORMAT) -> dict:
+    """
+    Decode the records of a model snapshot file.
+
+    Args:
+        data (bytes): The snapshot file content.
+        fmt (str): One of SNAPSHOT_FORMATS.
+
+    Returns:
+        dict: Serialized objects by ID.
+    """
+    if fmt == "binary":
+        return marshal.loads(data)
+    return loads(data)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+"""
+SQLite storage engine: persists each model class in a table of an
+embedded SQLite database in WAL mode, one column per model field.
+"""
+from typing import TypeVar, List, Iterator, Tuple
+import sqlite3
+import threading
+
+ITERATE_BATCH_SIZE = 500
+
+
+class SQLiteStorage:
+    """
+    Storage engine backed by an SQLite database.
+
+    Every save and remove is its own transaction, committed before it
+    returns; WAL mode lets readers run while a writer commits. Each class
+    gets a table named after it with an index on every attribute in its
+    INDEXED_ATTRIBUTES, and one on (created_at, id) for the keyset
+    pagination of all(). Each thread uses its own connection, until
+    close() is called on that thread, e.g. at the end of a request.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Initialize the engine.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._tables = set()
+        self._lock = threading.Lock()
+        self._wal = False
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Return the connection of the current thread, opening it if needed.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.row_factory = sqlite3.Row
+            # WAL mode is stored in the database file: set it once
+            if not self._wal:
+                conn.execute("PRAGMA journal_mode=WAL")
+                self._wal = True
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """
+        Close the connection of the current thread, if it has one; the
+        next query on the thread opens a new one.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def table(self, cls: type) -> str:
+        """
+        Create the table and indexes of the class if needed, adding the
+        columns of fields declared since the table was created.
+
+        Args:
+            cls (type): The model class.
+
+        Returns:
+            str: The quoted table name.
+        """
+        name = f'"{cls.__name__}"'
+        if cls in self._tables:
+            return name
+
+        with self._lock:
+            conn = self.connection()
+            with conn:
+                columns = ", ".join(f'"{field}"' for field in cls.FIELDS
+                                    if field != 'id')
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {name} '
+                             f'("id" TEXT PRIMARY KEY, {columns})')
+                existing = {row['name'] for row in
+                            conn.execute(f'PRAGMA table_info({name})')}
+                for field in cls.FIELDS:
+                    if field not in existing:
+                        conn.execute(f'ALTER TABLE {name} '
+                                     f'ADD COLUMN "{field}"')
+                for attr in cls.INDEXED_ATTRIBUTES:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS '
+                                 f'"{cls.__name__}_{attr}" '
+                                 f'ON {name} ("{attr}")')
+                conn.execute(f'CREATE INDEX IF NOT EXISTS '
+                             f'"{cls.__name__}_cursor" ON {name} '
+                             f'("created_at", "id")')
+            self._tables.add(cls)
+        return name
+
+    def load(self, cls: type):
+        """
+        Prepare the table of the class; rows are read on demand.
+
+        Args:
+            cls (type): The model class.
+        """
+        self.table(cls)
+
+    def reload(self, cls: type):
+        """
+        Nothing to do: every read queries the database.
+
+        Args:
+            cls (type): The model class.
+        """
+        self.table(cls)
+
+    def dump(self, cls: type):
+        """
+        Checkpoint the write-ahead log into the database file.
+
+        Args:
+            cls (type): The model class.
+        """
+        self.table(cls)
+        self.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def save(self, obj: TypeVar('Base')):
+        """
+        Insert or update the row of an object in one transaction.
+
+        Args:
+            obj (Base): The object to save.
+        """
+        cls = obj.__class__
+        name = self.table(cls)
+        record = obj.to_json(True)
+        columns = ", ".join(f'"{field}"' for field in record)
+        placeholders = ", ".join("?" for _ in record)
+        updates = ", ".join(f'"{field}" = excluded."{field}"'
+                            for field in record if field != 'id')
+        conn = self.connection()
+        with conn:
+            conn.execute(f'INSERT INTO {name} ({columns}) '
+                         f'VALUES ({placeholders}) '
+                         f'ON CONFLICT("id") DO UPDATE SET {updates}',
+                         tuple(record.values()))
+
+    def remove(self, obj: TypeVar('Base')):
+        """
+        Delete the row of an object in one transaction.
+
+        Args:
+            obj (Base): The object to remove.
+        """
+        name = self.table(obj.__class__)
+        conn = self.connection()
+        with conn:
+            conn.execute(f'DELETE FROM {name} WHERE "id" = ?', (obj.id,))
+
+    def count(self, cls: type) -> int:
+        """
+        Count the rows of the class.
+
+        Args:
+            cls (type): The model class.
+
+        Returns:
+            int: The number of objects.
+        """
+        name = self.table(cls)
+        return self.connection().execute(
+            f'SELECT COUNT(*) FROM {name}').fetchone()[0]
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """
+        Retrieve an object of the class by ID.
+
+        Args:
+            cls (type): The model class.
+            obj_id (str): The ID of the object.
+
+        Returns:
+            Base: The object, or None if not found.
+        """
+        name = self.table(cls)
+        row = self.connection().execute(
+            f'SELECT * FROM {name} WHERE "id" = ?', (obj_id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**row)
+
+    def iterate(self, cls: type, limit: int = None,
+                after: Tuple[str, str] = None) -> Iterator[TypeVar('Base')]:
+        """
+        Lazily iterate over the objects of the class ordered by created_at
+        then ID, reading the rows in batches.
+
+        Args:
+            cls (type): The model class.
+            limit (int): Maximum number of objects, or None for all.
+            after (Tuple[str, str]): Only return the objects after it.
+
+        Returns:
+            Iterator[Base]: An iterator over the objects.
+        """
+        name = self.table(cls)
+        query = f'SELECT * FROM {name}'
+        params = []
+        if after is not None:
+            query += ' WHERE ("created_at", "id") > (?, ?)'
+            params.extend(after)
+        query += ' ORDER BY "created_at", "id" LIMIT ?'
+        params.append(-1 if limit is None else limit)
+
+        cursor = self.connection().execute(query, params)
+        while True:
+            rows = cursor.fetchmany(ITERATE_BATCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield cls(**row)
+
+    def search(self, cls: type, attributes: dict) -> List[TypeVar('Base')]:
+        """
+        Search for objects of the class matching specific attributes.
+
+        The values stored as-is in their column (strings, numbers and
+        None) are matched in SQL, using the column indexes; every result
+        is then checked with Base.matches, so other values, such as
+        datetimes, compare exactly as with the file engine.
+
+        Args:
+            cls (type): The model class.
+            attributes (dict): Attributes to match against.
+
+        Returns:
+            List[Base]: A list of matching objects, in insertion order.
+        """
+        name = self.table(cls)
+        clauses = []
+        params = []
+        for k, v in attributes.items():
+            if k not in cls.FIELDS or k in cls.TIMESTAMP_FIELDS:
+                continue
+            if v is None:
+                clauses.append(f'"{k}" IS NULL')
+            elif type(v) in (str, int, float):
+                clauses.append(f'"{k}" = ?')
+                params.append(v)
+
+        query = f'SELECT * FROM {name}'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY rowid'
+
+        objs = [cls(**row) for row in
+                self.connection().execute(query, params)]
+        if not attributes:
+            return objs
+        return [obj for obj in objs if obj.matches(attributes)]
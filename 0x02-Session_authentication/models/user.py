@@ -10,6 +10,9 @@ class User(Base):
     User class for managing user-related data and functionalities.
     """
 
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+    INDEXED_ATTRIBUTES = ('email',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a new User instance.
@@ -8,6 +8,9 @@ class UserSession(Base):
     User Session Class for managing user session data.
     """
 
+    __slots__ = ('user_id', 'session_id')
+    INDEXED_ATTRIBUTES = ('session_id',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a new UserSession instance.